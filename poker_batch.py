@@ -0,0 +1,203 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from poker_calculator import PokerWinRateCalculator, _count_exact_deals
+
+# 离线批量计算胜率: 从 JSONL 或 CSV 文件逐行读取牌局，在进程池中计算，按输入顺序逐行写出结果
+# 用法: python poker_batch.py spots.jsonl results.jsonl --workers 8
+#
+# 每个牌局的字段(CSV 为同名列):
+#   hand         手牌，例如 "As Kd"(JSONL 中也可以是列表)
+#   board        公牌，可省略，例如 "Qh 7c 2d"
+#   players      玩家总数(包括自己)
+#   simulations  模拟次数，可省略，默认使用 --simulations
+#   ranges       对手手牌范围，可省略，例如 "QQ+, AKs"
+#   seed         随机种子，可省略，默认使用 --seed；指定后结果可复现
+#   id           可省略，原样写入结果
+#
+# 输出文件同时作为检查点: 中断后以相同参数重新运行会跳过已写出的行继续计算。
+# 输入逐行读取，同时提交的牌局数不超过 进程数 x 4，内存占用与输入文件大小无关
+
+# 单个牌局的模拟次数上限；精确枚举的规模上限为 模拟次数上限 x exact_cost_ratio，与 HTTP 服务相同
+MAX_SIMULATIONS = 1000000
+
+RESULT_FIELDS = ['line', 'id', 'hand', 'board', 'players', 'win_rate', 'tie_rate', 'ci_low', 'ci_high',
+                 'samples', 'engine', 'error']
+
+_store = None
+
+
+def _init_worker(store_path):
+    # 每个工作进程各自打开胜率库
+    global _store
+    if store_path:
+        from poker_equity_store import EquityStore
+        _store = EquityStore(store_path)
+
+
+def _split_cards(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return value.replace(',', ' ').split()
+    return list(value)
+
+
+def compute_spot(line, spot, simulations, engine, seed=None):
+    # 返回一行结果；spot 为 CSV 的一行(dict)或 JSONL 的一行文本。
+    # 牌局无效(包括无法解析的行)时记录错误信息而不中断整个批次
+    row = {'line': line}
+    try:
+        if isinstance(spot, str):
+            spot = json.loads(spot)
+        if not isinstance(spot, dict):
+            raise ValueError("每行必须是JSON对象")
+        row.update(id=spot.get('id'), hand=spot.get('hand'), board=spot.get('board'), players=spot.get('players'))
+        hand = _split_cards(spot.get('hand'))
+        if len(hand) != 2:
+            raise ValueError("需要两张手牌，例如 \"As Kd\"")
+        players = int(spot['players'])
+        if not 2 <= players <= 10:
+            raise ValueError("玩家数量必须在2到10之间")
+        calculator = PokerWinRateCalculator(players, hand)
+        board = _split_cards(spot.get('board'))
+        if board:
+            calculator.add_community_cards(board)
+        if spot.get('ranges'):
+            calculator.set_opponent_ranges(spot['ranges'])
+        # CSV 中的空单元格与省略相同；0 和负数是无效值，不回退到默认值
+        if spot.get('simulations') not in (None, ''):
+            simulations = spot['simulations']
+        simulations = int(simulations)
+        if not 1 <= simulations <= MAX_SIMULATIONS:
+            raise ValueError(f"模拟次数必须在1到{MAX_SIMULATIONS}之间")
+        if engine == 'exact':
+            # 结果按输入顺序写出，一个规模过大的精确枚举会让整个批次停滞
+            known = len(calculator.my_cards) + len(calculator.community_cards)
+            deals = _count_exact_deals(52 - known, 5 - len(calculator.community_cards), players - 1)
+            if deals > MAX_SIMULATIONS * calculator.exact_cost_ratio:
+                raise ValueError(f"精确枚举的规模过大({deals}种)，请使用 auto 或模拟引擎")
+        store = None if calculator.has_opponent_ranges() else _store
+        seed = spot.get('seed', seed)
+        result = calculator.calculate_equity(simulations, engine=engine, store=store,
+                                             seed=None if seed in (None, '') else int(seed))
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+        return row
+    row.update(win_rate=round(result.win_rate, 6), tie_rate=round(result.tie_rate, 6),
+               ci_low=round(result.ci_low, 6), ci_high=round(result.ci_high, 6),
+               samples=result.samples, engine=result.engine)
+    return row
+
+
+def read_spots(path):
+    # 逐行产出 (行号, 牌局)，行号从1开始，空行不计；JSONL 的行在 compute_spot 中解析
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            for line, spot in enumerate(csv.DictReader(f), start=1):
+                yield line, spot
+        else:
+            line = 0
+            for text in f:
+                if text.strip():
+                    line += 1
+                    yield line, text
+
+
+def count_completed(path):
+    # 统计输出文件中已完整写出的结果行数；末尾写到一半的行会被截掉
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)
+        lines = data[:end].count(b'\n')
+    if path.endswith('.csv'):
+        lines = max(lines - 1, 0)
+    return lines
+
+
+class ResultWriter:
+    def __init__(self, path, resume):
+        self.csv = path.endswith('.csv')
+        new_file = not (resume and os.path.exists(path) and os.path.getsize(path))
+        self.file = open(path, 'w' if new_file else 'a', newline='', encoding='utf-8')
+        if self.csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, row):
+        if self.csv:
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        # 每行写出后立即刷新，中断时已完成的结果都在文件中
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run_batch(input_path, output_path, simulations=10000, workers=1, engine='auto', store_path=None,
+              resume=True, seed=None):
+    completed = count_completed(output_path) if resume else 0
+    writer = ResultWriter(output_path, resume)
+    spots = ((line, spot) for line, spot in read_spots(input_path) if line > completed)
+    written = 0
+    start_time = time.time()
+
+    def report(row):
+        nonlocal written
+        writer.write(row)
+        written += 1
+        if written % 100 == 0:
+            print(f"已完成 {completed + written} 个牌局 (本次 {written / (time.time() - start_time):.1f} 个/秒)")
+
+    try:
+        if workers == 1:
+            _init_worker(store_path)
+            for line, spot in spots:
+                report(compute_spot(line, spot, simulations, engine, seed))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(store_path,)) as pool:
+                # 有界的提交窗口: 按输入顺序等待最早提交的牌局，保持内存占用恒定
+                pending = deque()
+                for line, spot in spots:
+                    pending.append(pool.submit(compute_spot, line, spot, simulations, engine, seed))
+                    if len(pending) >= workers * 4:
+                        report(pending.popleft().result())
+                while pending:
+                    report(pending.popleft().result())
+    finally:
+        writer.close()
+    return completed, written
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="从 JSONL/CSV 文件批量计算胜率")
+    parser.add_argument('input', help="输入文件(.jsonl 或 .csv)")
+    parser.add_argument('output', help="输出文件(.jsonl 或 .csv)，同时作为检查点")
+    parser.add_argument('--simulations', type=int, default=10000, help="牌局未指定时的模拟次数")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="并行计算的进程数")
+    parser.add_argument('--engine', default='auto', help="模拟引擎: auto, exact, python 或 numpy")
+    parser.add_argument('--store', default=None, help="胜率库(SQLite)路径，不指定则不使用")
+    parser.add_argument('--seed', type=int, default=None, help="随机种子，指定后相同输入的结果完全一致")
+    parser.add_argument('--restart', action='store_true', help="忽略已有输出，从头计算")
+    args = parser.parse_args()
+
+    skipped, written = run_batch(args.input, args.output, args.simulations, args.workers, args.engine,
+                                 args.store, resume=not args.restart, seed=args.seed)
+    if skipped:
+        print(f"跳过已完成的 {skipped} 个牌局")
+    print(f"共写出 {written} 个结果到 {args.output}")
@@ -0,0 +1,166 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from itertools import combinations
+
+from poker_calculator import CARDS, HandEvaluator, IncrementalEvaluator, PokerWinRateCalculator
+
+# 性能基准: 牌力评估和各引擎的模拟速度、内存峰值以及导入耗时，结果写入 JSON 或 CSV，便于跟踪性能回退
+# 用法: python poker_benchmark.py --output bench.json
+#       python poker_benchmark.py --players 2,6,10 --engines python,numpy,multiprocess --output bench.csv
+
+HERO_CARDS = ['As', 'Kd']
+STREETS = {
+    'preflop': [],
+    'flop': ['Qh', '7c', '2d'],
+    'turn': ['Qh', '7c', '2d', '9s'],
+    'river': ['Qh', '7c', '2d', '9s', '3h'],
+}
+
+
+def measure_import_time(repeat=3):
+    # 在新进程中导入 poker_calculator(包括构建查找表)，取最短耗时
+    command = [sys.executable, '-c',
+               'import time; t = time.perf_counter(); import poker_calculator; print(time.perf_counter() - t)']
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(command, cwd=cwd, capture_output=True, text=True, check=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return {'benchmark': 'import', 'name': 'poker_calculator', 'calls': repeat,
+            'seconds': round(min(times), 4), 'rate': None}
+
+
+def _timed(name, function, hands):
+    start = time.perf_counter()
+    for hand in hands:
+        function(hand)
+    seconds = time.perf_counter() - start
+    return {'benchmark': 'evaluator', 'name': name, 'calls': len(hands),
+            'seconds': round(seconds, 4), 'rate': round(len(hands) / seconds)}
+
+
+def measure_evaluators(count, seed=0):
+    rng = random.Random(seed)
+    seven = [rng.sample(range(52), 7) for _ in range(count)]
+    five_cards = [[CARDS[i] for i in hand[:5]] for hand in seven]
+    seven_cards = [[CARDS[i] for i in hand] for hand in seven]
+    boards = [IncrementalEvaluator(hand[2:]) for hand in seven]
+
+    def reference_seven(cards):
+        # 原始算法: 在21种5张组合中取最大
+        return max(HandEvaluator.evaluate_5_card_hand(combo) for combo in combinations(cards, 5))
+
+    rows = [
+        _timed('evaluate_5_card_hand', HandEvaluator.evaluate_5_card_hand, five_cards),
+        _timed('evaluate_5_card_hand x21 (7张)', reference_seven, seven_cards[:max(count // 20, 1)]),
+        _timed('evaluate_hand (7张)', HandEvaluator.evaluate_hand, seven_cards),
+        _timed('evaluate_indices (7张)', HandEvaluator.evaluate_indices, seven),
+    ]
+    start = time.perf_counter()
+    for board, hand in zip(boards, seven):
+        board.score_with(hand[0], hand[1])
+    seconds = time.perf_counter() - start
+    rows.append({'benchmark': 'evaluator', 'name': 'IncrementalEvaluator.score_with', 'calls': count,
+                 'seconds': round(seconds, 4), 'rate': round(count / seconds)})
+    return rows
+
+
+def measure_simulation(engine, players, street, simulations, workers, memory=True):
+    # engine 为 python、numpy 或 multiprocess(python 引擎 + 多进程)；不使用缓存、胜率表和样本复用
+    calculator_engine = 'python' if engine == 'multiprocess' else engine
+
+    def run():
+        calculator = PokerWinRateCalculator(players, HERO_CARDS)
+        if STREETS[street]:
+            calculator.add_community_cards(STREETS[street])
+        return calculator.calculate_equity(simulations, workers=workers if engine == 'multiprocess' else 1,
+                                           engine=calculator_engine, cache=None)
+
+    run()  # 预热: 进程池启动、NumPy 查找表构建
+    start = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        # tracemalloc 会拖慢执行，单独运行一次测量内存峰值(只统计当前进程)
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+
+    return {'benchmark': 'simulation', 'name': engine, 'players': players, 'street': street,
+            'workers': workers if engine == 'multiprocess' else 1, 'calls': result.samples,
+            'seconds': round(seconds, 4), 'rate': round(result.samples / seconds),
+            'win_rate': round(result.win_rate, 4), 'peak_memory_kb': peak}
+
+
+def run_benchmarks(players, streets, engines, simulations, workers, evaluator_calls, memory=True):
+    rows = [measure_import_time()]
+    rows.extend(measure_evaluators(evaluator_calls))
+    for engine in engines:
+        for street in streets:
+            for num_players in players:
+                row = measure_simulation(engine, num_players, street, simulations, workers, memory)
+                print(f"{engine:>12} {street:>7} {num_players:>2}人: {row['rate']:>9,} 次/秒")
+                rows.append(row)
+    return rows
+
+
+def environment():
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_results(rows, path):
+    # 按扩展名写出 JSON(含运行环境信息)或 CSV(每行一条结果)
+    if path.endswith('.csv'):
+        fields = []
+        for row in rows:
+            fields.extend(field for field in row if field not in fields)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': rows}, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="牌力评估与胜率模拟的性能基准")
+    parser.add_argument('--players', default='2,3,4,5,6,7,8,9,10', help="逗号分隔的玩家数量")
+    parser.add_argument('--streets', default='preflop,flop,turn,river', help="逗号分隔的阶段")
+    parser.add_argument('--engines', default='python,numpy,multiprocess',
+                        help="逗号分隔的引擎: python, numpy, multiprocess")
+    parser.add_argument('--simulations', type=int, default=20000, help="每项模拟基准的模拟次数")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="multiprocess 使用的进程数")
+    parser.add_argument('--evaluator-calls', type=int, default=100000, help="牌力评估基准的调用次数")
+    parser.add_argument('--no-memory', action='store_true', help="不测量内存峰值")
+    parser.add_argument('--output', default='benchmark.json', help="结果文件(.json 或 .csv)")
+    args = parser.parse_args()
+
+    engines = args.engines.split(',')
+    if 'numpy' in engines:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            print("未安装 NumPy，跳过 numpy 引擎")
+            engines.remove('numpy')
+
+    rows = run_benchmarks([int(n) for n in args.players.split(',')], args.streets.split(','), engines,
+                          args.simulations, args.workers, args.evaluator_calls, not args.no_memory)
+    write_results(rows, args.output)
+    print(f"已写入 {args.output}")
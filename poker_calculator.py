@@ -1,68 +1,224 @@
+import copy
+import hashlib
+import json
+import multiprocessing
+import os
 import random
+import threading
 import time
-from collections import Counter
-from tqdm import tqdm
+from array import array
+from collections import Counter, OrderedDict
+from itertools import combinations, permutations
+from math import comb, sqrt
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from poker_progress import CallbackReporter, TqdmReporter
+
+# 整数编码: 牌的序号 = (点数 - 2) * 4 + 花色序号，范围 0-51
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+SUITS = ['♠', '♥', '♦', '♣']
+_RANK_VALUES = {rank: value for value, rank in enumerate(RANKS, start=2)}
+_SUIT_INDEX = {suit: index for index, suit in enumerate(SUITS)}
 
 class Card:
+    __slots__ = ('rank', 'suit', 'rank_value', 'index')
+
     def __init__(self, rank, suit):
         self.rank = rank
         self.suit = suit
         self.rank_value = self.get_rank_value()
+        self.index = (self.rank_value - 2) * 4 + _SUIT_INDEX[suit]
         
     def get_rank_value(self):
-        if self.rank == 'A':
-            return 14
-        elif self.rank == 'K':
-            return 13
-        elif self.rank == 'Q':
-            return 12
-        elif self.rank == 'J':
-            return 11
-        else:
-            return int(self.rank)
+        return _RANK_VALUES[self.rank]
+
+    @staticmethod
+    def from_index(index):
+        return CARDS[index]
             
     def __repr__(self):
         return f"{self.rank}{self.suit}"
         
     def __eq__(self, other):
-        return self.rank == other.rank and self.suit == other.suit
+        return isinstance(other, Card) and self.index == other.index
         
     def __hash__(self):
-        return hash((self.rank, self.suit))
+        return self.index
+
+# 52张牌的共享实例，按序号排列
+CARDS = [Card(rank, suit) for rank in RANKS for suit in SUITS]
 
 class Deck:
-    def __init__(self):
-        ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-        suits = ['♠', '♥', '♦', '♣']
-        self.cards = [Card(rank, suit) for suit in suits for rank in ranks]
-        random.shuffle(self.cards)
+    def __init__(self, dead_cards=(), rng=None):
+        # 牌堆只保存整数序号，dead_cards 中的牌(Card 或序号)不进入牌堆
+        # rng 为 random.Random 实例，默认使用全局随机数生成器
+        dead = {card if isinstance(card, int) else card.index for card in dead_cards}
+        self.rng = rng if rng is not None else random
+        self.cards = [index for index in range(52) if index not in dead]
+        self.rng.shuffle(self.cards)
         
     def remove_card(self, card):
-        for i, c in enumerate(self.cards):
-            if c.rank == card.rank and c.suit == card.suit:
-                del self.cards[i]
-                return True
-        return False
+        index = card if isinstance(card, int) else card.index
+        try:
+            self.cards.remove(index)
+        except ValueError:
+            return False
+        return True
         
     def draw(self, count=1):
         if count == 1:
             return self.cards.pop()
         return [self.cards.pop() for _ in range(count)]
 
+    def deal(self, count):
+        # 部分 Fisher-Yates: 只随机排列前 count 张并返回，不移除任何牌，
+        # 牌堆因此可以在每次模拟中重复使用
+        cards = self.cards
+        remaining = len(cards)
+        rand = self.rng.random
+        for i in range(count):
+            j = i + int(rand() * (remaining - i))
+            cards[i], cards[j] = cards[j], cards[i]
+        return cards[:count]
+
+# 查表评估器的编码方式:
+# 牌力为一个整数 = 牌型 << 20 | 依次排列的5个比较点数(每个4位)，
+# 与 evaluate_5_card_hand 返回的元组保持完全相同的大小顺序。
+# 每张牌的键 = 点数键(5进制计数) << 16 | 花色计数(每种花色4位)，
+# 多张牌的键直接相加即可得到点数多重集合与各花色张数。
+_RANK_KEYS = {rank: 5 ** (rank - 2) for rank in range(2, 15)}
+_CARD_KEYS = [(_RANK_KEYS[(i >> 2) + 2] << 16) | (1 << (4 * (i & 3))) for i in range(52)]
+_CARD_RANK_BITS = [1 << (i >> 2) for i in range(52)]
+_FLUSH_CHECK = 0x8888
+
+
+def _pack_score(category, ranks):
+    score = category
+    for i in range(5):
+        score = (score << 4) | (ranks[i] if i < len(ranks) else 0)
+    return score
+
+
+def _best_straight(mask):
+    # mask 的第 r-2 位表示点数 r；返回最大顺子的顶张，没有则返回0
+    for high in range(14, 5, -1):
+        run = 0b11111 << (high - 6)
+        if mask & run == run:
+            return high
+    # A-2-3-4-5
+    if mask & 0b1000000001111 == 0b1000000001111:
+        return 5
+    return 0
+
+
+def _score_flush_mask(mask):
+    # 同一花色的点数集合(至少5张)的最佳牌力
+    straight_high = _best_straight(mask)
+    if straight_high == 14:
+        return _pack_score(10, [14])
+    if straight_high:
+        return _pack_score(9, [straight_high])
+    ranks = [r for r in range(14, 1, -1) if mask >> (r - 2) & 1]
+    return _pack_score(6, ranks[:5])
+
+
+def _score_rank_counts(counts):
+    # 不考虑同花时，按点数计数(counts[r] 为点数 r 的张数)求最佳5张牌力
+    present = [r for r in range(14, 1, -1) if counts[r]]
+    quads = [r for r in present if counts[r] == 4]
+    trips = [r for r in present if counts[r] == 3]
+    pairs = [r for r in present if counts[r] == 2]
+
+    if quads:
+        kicker = max(r for r in present if r != quads[0])
+        return _pack_score(8, [quads[0], kicker])
+
+    if trips and (len(trips) > 1 or pairs):
+        pair_rank = max(trips[1:] + pairs)
+        return _pack_score(7, [trips[0], pair_rank])
+
+    mask = 0
+    for r in present:
+        mask |= 1 << (r - 2)
+    straight_high = _best_straight(mask)
+    if straight_high:
+        return _pack_score(5, [straight_high])
+
+    if trips:
+        kickers = [r for r in present if r != trips[0]][:2]
+        return _pack_score(4, [trips[0]] + kickers)
+
+    if len(pairs) >= 2:
+        kicker = max(r for r in present if r not in pairs[:2])
+        return _pack_score(3, pairs[:2] + [kicker])
+
+    if pairs:
+        kickers = [r for r in present if r != pairs[0]][:3]
+        return _pack_score(2, [pairs[0]] + kickers)
+
+    return _pack_score(1, present[:5])
+
+
+def _build_flush_table():
+    table = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        if bin(mask).count('1') >= 5:
+            table[mask] = _score_flush_mask(mask)
+    return table
+
+
+def _build_rank_table():
+    # 枚举5-7张牌的所有点数多重集合(每个点数最多4张)
+    table = {}
+    counts = [0] * 15
+
+    def fill(rank, remaining, key):
+        if rank > 14:
+            if 7 - remaining >= 5:
+                table[key] = _score_rank_counts(counts)
+            return
+        for count in range(min(4, remaining) + 1):
+            counts[rank] = count
+            fill(rank + 1, remaining - count, key + count * _RANK_KEYS[rank])
+        counts[rank] = 0
+
+    fill(2, 7, 0)
+    return table
+
+
+_FLUSH_TABLE = _build_flush_table()
+_RANK_TABLE = _build_rank_table()
+
+
+def _score_key(key, cards):
+    # key 为 cards(整数序号)的 _CARD_KEYS 之和
+    if (key + 0x3333) & _FLUSH_CHECK:
+        for suit in range(4):
+            if (key >> (4 * suit)) & 0xF >= 5:
+                mask = 0
+                for card in cards:
+                    if card & 3 == suit:
+                        mask |= _CARD_RANK_BITS[card]
+                return _FLUSH_TABLE[mask]
+    return _RANK_TABLE[key >> 16]
+
+
 class HandEvaluator:
     @staticmethod
     def evaluate_hand(cards):
-        # 确保我们只评估5张牌
-        if len(cards) > 5:
-            # 生成所有可能的5张牌组合并找出最佳组合
-            from itertools import combinations
-            best_score = (0,)
-            for combo in combinations(cards, 5):
-                score = HandEvaluator.evaluate_5_card_hand(list(combo))
-                if score > best_score:
-                    best_score = score
-            return best_score
-        return HandEvaluator.evaluate_5_card_hand(cards)
+        # 一次遍历得到5-7张牌的整数牌力，数值越大牌越强
+        return HandEvaluator.evaluate_indices([card.index for card in cards])
+
+    @staticmethod
+    def evaluate_indices(cards):
+        # 与 evaluate_hand 相同，但直接接受整数序号
+        if not 5 <= len(cards) <= 7:
+            raise ValueError(f"评估手牌需要5到7张牌，当前为{len(cards)}张")
+        key = 0
+        for card in cards:
+            key += _CARD_KEYS[card]
+        return _score_key(key, cards)
     
     @staticmethod
     def evaluate_5_card_hand(cards):
@@ -144,13 +300,809 @@ class HandEvaluator:
         # 高牌
         return (1, [c.rank_value for c in sorted_cards])
 
+class IncrementalEvaluator:
+    # 可增量更新的牌力评估器: 保存点数与花色计数(合并在 key 中)和每种花色的点数位掩码，
+    # add/remove 均为 O(1)，score 直接查表，无需枚举5张牌的组合
+    # 模拟时公牌的状态只建立一次，自己和每名对手的两张手牌通过 score_with 叠加
+    __slots__ = ('key', 'suit_masks', 'count')
+
+    def __init__(self, cards=()):
+        self.key = 0
+        self.suit_masks = [0, 0, 0, 0]
+        self.count = 0
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        # card 为整数序号或 Card
+        if not isinstance(card, int):
+            card = card.index
+        self.key += _CARD_KEYS[card]
+        self.suit_masks[card & 3] |= _CARD_RANK_BITS[card]
+        self.count += 1
+
+    def remove(self, card):
+        if not isinstance(card, int):
+            card = card.index
+        self.key -= _CARD_KEYS[card]
+        self.suit_masks[card & 3] &= ~_CARD_RANK_BITS[card]
+        self.count -= 1
+
+    def copy(self):
+        other = IncrementalEvaluator()
+        other.key = self.key
+        other.suit_masks = self.suit_masks[:]
+        other.count = self.count
+        return other
+
+    def _lookup(self, key, extra):
+        if (key + 0x3333) & _FLUSH_CHECK:
+            # 7张牌中最多只有一种花色达到5张，同花时不可能有四条或葫芦
+            for suit in range(4):
+                if (key >> (4 * suit)) & 0xF >= 5:
+                    mask = self.suit_masks[suit]
+                    for card in extra:
+                        if card & 3 == suit:
+                            mask |= _CARD_RANK_BITS[card]
+                    return _FLUSH_TABLE[mask]
+        return _RANK_TABLE[key >> 16]
+
+    def score(self):
+        if not 5 <= self.count <= 7:
+            raise ValueError(f"评估手牌需要5到7张牌，当前为{self.count}张")
+        return self._lookup(self.key, ())
+
+    def score_with(self, *cards):
+        # 当前状态再加上若干张牌(整数序号，通常为两张手牌)后的牌力，不修改状态
+        key = self.key
+        for card in cards:
+            key += _CARD_KEYS[card]
+        return self._lookup(key, cards)
+
+
+# 每个模拟批次的大小，进度回调和多进程任务都按批次进行
+_BATCH_SIZE = 1000
+# 自适应停止前至少需要的样本数，避免样本过少时方差估计失真
+_MIN_ADAPTIVE_SAMPLES = 2 * _BATCH_SIZE
+
+_process_pools = {}
+
+
+def _batch_seeds(seed, count):
+    # 每 _BATCH_SIZE 个样本一段的随机种子。指定 seed 时由 (seed, 段序号) 经哈希导出，
+    # 结果只取决于 seed，与进程数、批次大小和批次的完成顺序无关；否则使用系统随机源
+    if seed is None:
+        source = random.SystemRandom()
+        return [source.getrandbits(64) for _ in range(count)]
+    return [int.from_bytes(hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=8).digest(), 'little')
+            for i in range(count)]
+
+
+def _get_process_pool(workers):
+    # 进程池按进程数缓存复用，避免每次计算都重新启动进程和构建查找表
+    pool = _process_pools.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        _process_pools[workers] = pool
+    return pool
+
+
+# 保存的模拟样本: 低52位为本次补全的公牌位掩码，最高字节为结果
+_RUNOUT_WIN = 1 << 56
+_RUNOUT_TIE = 2 << 56
+
+
+def _simulate_batch(my_cards, community_cards, num_opponents, simulations, seed=None, record=False):
+    # 用独立的随机数生成器模拟 simulations 次，返回 (wins, ties, simulations)
+    # record=True 时额外返回每个样本的公牌补全和结果(array('Q'))，供下一街复用
+    # 定义为模块级函数，以便在进程池中执行
+    deck = Deck(my_cards + community_cards, random.Random(seed))
+    needed = 5 - len(community_cards)
+    deal_count = needed + 2 * num_opponents
+    # 已知公牌的状态在所有样本间共享，每个样本只叠加补全的公牌，结束后再移除
+    board = IncrementalEvaluator(community_cards)
+    wins = 0
+    ties = 0
+    runouts = array('Q') if record else None
+
+    for _ in range(simulations):
+        dealt = deck.deal(deal_count)
+        extra = dealt[:needed]
+        for card in extra:
+            board.add(card)
+
+        # Evaluate my hand
+        my_score = board.score_with(*my_cards)
+
+        # Evaluate other players' hands
+        best_other = max(board.score_with(dealt[start], dealt[start + 1])
+                         for start in range(needed, deal_count, 2))
+        for card in extra:
+            board.remove(card)
+
+        # Compare results: 只有没有任何对手更大时才算平局
+        if my_score > best_other:
+            wins += 1
+            outcome = _RUNOUT_WIN
+        elif my_score == best_other:
+            ties += 1
+            outcome = _RUNOUT_TIE
+        else:
+            outcome = 0
+
+        if record:
+            for card in extra:
+                outcome |= 1 << card
+            runouts.append(outcome)
+
+    if record:
+        return wins, ties, simulations, runouts
+    return wins, ties, simulations
+
+
+_numpy_tables = None
+
+
+def _get_numpy_tables():
+    # NumPy 为可选依赖，只在使用 numpy 引擎时导入并构建数组形式的查找表
+    global _numpy_tables
+    if _numpy_tables is None:
+        import numpy as np
+        rank_keys = np.array(sorted(_RANK_TABLE), dtype=np.int64)
+        _numpy_tables = {
+            'np': np,
+            'rank_keys': rank_keys,
+            'rank_scores': np.array([_RANK_TABLE[key] for key in rank_keys.tolist()], dtype=np.int64),
+            'flush_scores': np.array(_FLUSH_TABLE, dtype=np.int64),
+            'card_ranks': np.array([_CARD_KEYS[i] >> 16 for i in range(52)], dtype=np.int64),
+            # 每张牌在4个花色上的点数位，用于累加出各花色的点数集合
+            'card_suit_bits': np.array([[_CARD_RANK_BITS[i] if i & 3 == suit else 0 for suit in range(4)]
+                                        for i in range(52)], dtype=np.int64),
+        }
+    return _numpy_tables
+
+
+def _score_arrays(tables, rank_keys, suit_masks):
+    # rank_keys: (B,) 点数键之和；suit_masks: (B, 4) 各花色的点数位集合
+    # 7张牌中最多只有一种花色达到5张，且此时不可能出现四条或葫芦，
+    # 因此同花牌力(不足5张时为0)与点数牌力取较大值即为最终牌力
+    np = tables['np']
+    positions = np.searchsorted(tables['rank_keys'], rank_keys)
+    rank_scores = tables['rank_scores'][positions]
+    flush_scores = tables['flush_scores'][suit_masks].max(axis=1)
+    return np.maximum(rank_scores, flush_scores)
+
+
+def _simulate_batch_numpy(my_cards, community_cards, num_opponents, simulations, seed=None, block_seeds=None,
+                          sweep=False):
+    # 向量化版本: 一次发出 simulations 组公牌和对手手牌，用数组运算统一评估
+    # sweep=True 时按对手数量 1..num_opponents 分别统计，返回值同 _sweep_batch
+    # 指定 block_seeds 时每 _BATCH_SIZE 个样本用对应的种子按 python 引擎完全相同的过程发牌，
+    # 结果与相同种子的 python 引擎逐位一致，用于对照验证两个引擎
+    tables = _get_numpy_tables()
+    np = tables['np']
+    card_ranks = tables['card_ranks']
+    card_suit_bits = tables['card_suit_bits']
+
+    dead = set(my_cards + community_cards)
+    stub = np.array([index for index in range(52) if index not in dead], dtype=np.int64)
+    needed = 5 - len(community_cards)
+    deal_count = needed + 2 * num_opponents
+
+    # 每行取随机排列的前 deal_count 张: 前 needed 张补齐公牌，其余两两作为对手手牌
+    if block_seeds is not None:
+        rows = []
+        for start, block_seed in zip(range(0, simulations, _BATCH_SIZE), block_seeds):
+            deck = Deck(my_cards + community_cards, random.Random(block_seed))
+            rows.extend(deck.deal(deal_count) for _ in range(min(_BATCH_SIZE, simulations - start)))
+        dealt = np.array(rows, dtype=np.int64).reshape(simulations, deal_count)
+    else:
+        rng = np.random.default_rng(seed)
+        order = np.argsort(rng.random((simulations, len(stub))), axis=1)[:, :deal_count]
+        dealt = stub[order]
+
+    known_board = np.array(community_cards, dtype=np.int64)
+    board_ranks = card_ranks[known_board].sum() + card_ranks[dealt[:, :needed]].sum(axis=1)
+    board_suits = card_suit_bits[known_board].sum(axis=0) + card_suit_bits[dealt[:, :needed]].sum(axis=1)
+
+    hero = np.array(my_cards, dtype=np.int64)
+    my_scores = _score_arrays(tables, board_ranks + card_ranks[hero].sum(),
+                              board_suits + card_suit_bits[hero].sum(axis=0))
+
+    holes = dealt[:, needed:].reshape(simulations, num_opponents, 2)
+    opponent_scores = _score_arrays(
+        tables,
+        (board_ranks[:, None] + card_ranks[holes].sum(axis=2)).ravel(),
+        (board_suits[:, None, :] + card_suit_bits[holes].sum(axis=2)).reshape(-1, 4),
+    ).reshape(simulations, num_opponents)
+
+    if sweep:
+        # 前 k 名对手中的最大牌力
+        best_prefix = np.maximum.accumulate(opponent_scores, axis=1)
+        return ((my_scores[:, None] > best_prefix).sum(axis=0).tolist(),
+                (my_scores[:, None] == best_prefix).sum(axis=0).tolist(), simulations)
+
+    best_opponents = opponent_scores.max(axis=1)
+    won = my_scores > best_opponents
+    tied = my_scores == best_opponents
+    return int(won.sum()), int(tied.sum()), simulations
+
+
+def _sweep_batch(my_cards, community_cards, num_opponents, simulations, seed=None):
+    # 每个样本发出 num_opponents 名对手，按顺序逐个评估并维护前 k 名对手中的最大牌力，
+    # 一次模拟同时得到对手数量为 1..num_opponents 时的结果。返回 (wins, ties, simulations)，
+    # wins[k - 1]/ties[k - 1] 为只有前 k 名对手时的胜/平次数
+    deck = Deck(my_cards + community_cards, random.Random(seed))
+    needed = 5 - len(community_cards)
+    deal_count = needed + 2 * num_opponents
+    board = IncrementalEvaluator(community_cards)
+    wins = [0] * num_opponents
+    ties = [0] * num_opponents
+
+    for _ in range(simulations):
+        dealt = deck.deal(deal_count)
+        extra = dealt[:needed]
+        for card in extra:
+            board.add(card)
+        my_score = board.score_with(*my_cards)
+        best_other = 0
+        for k, start in enumerate(range(needed, deal_count, 2)):
+            score = board.score_with(dealt[start], dealt[start + 1])
+            if score > best_other:
+                best_other = score
+                # 对手已经更大，之后更多对手的结果都是负
+                if best_other > my_score:
+                    break
+            if my_score > best_other:
+                wins[k] += 1
+            else:
+                ties[k] += 1
+        for card in extra:
+            board.remove(card)
+
+    return wins, ties, simulations
+
+
+def _simulate_range_batch(my_cards, community_cards, opponent_samplers, simulations, seed=None):
+    # 对手手牌按范围抽取的模拟，opponent_samplers 中每项为 AliasTable(按范围抽取) 或 None(随机手牌)
+    rng = random.Random(seed)
+    deck = Deck(my_cards + community_cards, rng)
+    cards = deck.cards
+    remaining = len(cards)
+    rand = rng.random
+    needed = 5 - len(community_cards)
+    range_samplers = [sampler for sampler in opponent_samplers if sampler is not None]
+    random_count = needed + 2 * (len(opponent_samplers) - len(range_samplers))
+    board = IncrementalEvaluator(community_cards)
+    wins = 0
+    ties = 0
+
+    for _ in range(simulations):
+        # 先按范围抽取对手手牌；任意两手冲突时整组重抽，各组手牌的概率与权重之积成正比
+        # (只重抽冲突的一手会让先抽的对手只按自身权重分布，忽略其留给后面对手的组合数)
+        for _ in range(100000):
+            used = 0
+            holes = []
+            for sampler in range_samplers:
+                a, b = sampler.sample(rng)
+                if (used >> a) & 1 or (used >> b) & 1:
+                    break
+                used |= (1 << a) | (1 << b)
+                holes.append([a, b])
+            else:
+                break
+        else:
+            raise ValueError("对手范围之间冲突过多，无法发牌")
+
+        # 再用部分 Fisher-Yates 从剩余牌中发出随机对手手牌和公牌，跳过已被范围占用的牌
+        dealt = []
+        i = 0
+        while len(dealt) < random_count:
+            j = i + int(rand() * (remaining - i))
+            cards[i], cards[j] = cards[j], cards[i]
+            if not (used >> cards[i]) & 1:
+                dealt.append(cards[i])
+            i += 1
+        extra = dealt[:needed]
+        for card in extra:
+            board.add(card)
+        holes.extend(dealt[start:start + 2] for start in range(needed, random_count, 2))
+
+        my_score = board.score_with(*my_cards)
+        best_other = max(board.score_with(*hole) for hole in holes)
+        for card in extra:
+            board.remove(card)
+        if my_score > best_other:
+            wins += 1
+        elif my_score == best_other:
+            ties += 1
+
+    return wins, ties, simulations
+
+
+def _stratified_batch(my_cards, community_cards, num_opponents, strata, rounds, seed=None):
+    # 分层抽样: strata 中每层为一组固定的未知公牌(接下来的 k 张)，每层模拟 rounds 次，
+    # 其余公牌和对手手牌随机发出。返回 (wins, ties, 样本数, 各层胜次数, 各层平局次数)
+    rng = random.Random(seed)
+    cards = Deck(my_cards + community_cards, rng).cards
+    remaining = len(cards)
+    rand = rng.random
+    needed = 5 - len(community_cards) - len(strata[0])
+    deal_count = needed + 2 * num_opponents
+    board = IncrementalEvaluator(community_cards)
+    stratum_wins = array('I', bytes(4 * len(strata)))
+    stratum_ties = array('I', bytes(4 * len(strata)))
+
+    for h, stratum in enumerate(strata):
+        used = 0
+        for card in stratum:
+            board.add(card)
+            used |= 1 << card
+        wins = 0
+        ties = 0
+        for _ in range(rounds):
+            # 部分 Fisher-Yates，跳过本层固定的公牌
+            dealt = []
+            i = 0
+            while len(dealt) < deal_count:
+                j = i + int(rand() * (remaining - i))
+                cards[i], cards[j] = cards[j], cards[i]
+                if not (used >> cards[i]) & 1:
+                    dealt.append(cards[i])
+                i += 1
+            extra = dealt[:needed]
+            for card in extra:
+                board.add(card)
+            my_score = board.score_with(*my_cards)
+            best_other = max(board.score_with(dealt[start], dealt[start + 1])
+                             for start in range(needed, deal_count, 2))
+            for card in extra:
+                board.remove(card)
+            if my_score > best_other:
+                wins += 1
+            elif my_score == best_other:
+                ties += 1
+        for card in stratum:
+            board.remove(card)
+        stratum_wins[h] = wins
+        stratum_ties[h] = ties
+
+    return sum(stratum_wins), sum(stratum_ties), len(strata) * rounds, stratum_wins, stratum_ties
+
+
+def _stratified_variance(stratum_wins, stratum_ties, samples):
+    # 各层样本数相同时，合并的层内样本方差；每层不足2个样本时返回 None(退回普通的样本方差)
+    strata = len(stratum_wins)
+    per_stratum = samples / strata
+    if per_stratum < 2:
+        return None
+    within = 0.0
+    for wins, ties in zip(stratum_wins, stratum_ties):
+        share = wins + ties / 2
+        within += wins + ties / 4 - share * share / per_stratum
+    return max(within / (samples - strata), 0.0)
+
+
+def _count_opponent_deals(hands, num_opponents, my_score, used=0, best=0):
+    # 递归枚举多名对手互不冲突的手牌分配，best 为已分配对手中的最大牌力，返回 (wins, ties, deals)
+    if num_opponents == 0:
+        if my_score > best:
+            return 1, 0, 1
+        return 0, (1 if my_score == best else 0), 1
+    wins = 0
+    ties = 0
+    deals = 0
+    for mask, score in hands:
+        if mask & used:
+            continue
+        w, t, d = _count_opponent_deals(hands, num_opponents - 1, my_score, used | mask, max(best, score))
+        wins += w
+        ties += t
+        deals += d
+    return wins, ties, deals
+
+
+def _enumerate_batch(my_cards, community_cards, num_opponents, boards):
+    # 精确枚举: 对 boards 中的每种公牌补全，遍历对手手牌的全部组合，返回 (wins, ties, deals)
+    dead = set(my_cards + community_cards)
+    stub = [index for index in range(52) if index not in dead]
+    pairs = [(a, b, _CARD_KEYS[a] + _CARD_KEYS[b], (1 << a) | (1 << b)) for a, b in combinations(stub, 2)]
+    my_key = sum(_CARD_KEYS[card] for card in my_cards)
+    community_key = sum(_CARD_KEYS[card] for card in community_cards)
+    wins = 0
+    ties = 0
+    deals = 0
+
+    for extra in boards:
+        board = community_cards + list(extra)
+        board_key = community_key
+        board_mask = 0
+        for card in extra:
+            board_key += _CARD_KEYS[card]
+            board_mask |= 1 << card
+        my_score = _score_key(board_key + my_key, my_cards + board)
+
+        if num_opponents == 1:
+            # 单挑时直接比较，不保存对手牌力
+            for a, b, pair_key, pair_mask in pairs:
+                if pair_mask & board_mask:
+                    continue
+                deals += 1
+                key = board_key + pair_key
+                if (key + 0x3333) & _FLUSH_CHECK:
+                    score = _score_key(key, [a, b] + board)
+                else:
+                    score = _RANK_TABLE[key >> 16]
+                if my_score > score:
+                    wins += 1
+                elif my_score == score:
+                    ties += 1
+        else:
+            # 每手对手牌在同一公牌下只评估一次
+            hands = []
+            for a, b, pair_key, pair_mask in pairs:
+                if pair_mask & board_mask:
+                    continue
+                key = board_key + pair_key
+                if (key + 0x3333) & _FLUSH_CHECK:
+                    hands.append((pair_mask, _score_key(key, [a, b] + board)))
+                else:
+                    hands.append((pair_mask, _RANK_TABLE[key >> 16]))
+            w, t, d = _count_opponent_deals(hands, num_opponents, my_score)
+            wins += w
+            ties += t
+            deals += d
+
+    return wins, ties, deals
+
+
+def _count_exact_deals(unknown_cards, needed, num_opponents):
+    # 精确枚举需要遍历的 (公牌补全, 对手手牌) 组合数
+    deals = comb(unknown_cards, needed)
+    remaining = unknown_cards - needed
+    for _ in range(num_opponents):
+        deals *= comb(remaining, 2)
+        remaining -= 2
+    return deals
+
+
+def _settle_showdown(scores, known_count, wins, ties, shares, squares):
+    # 摊牌结算: 牌力最大的 k 名玩家平分底池，每人得 1/k；只记录前 known_count 名已知手牌的玩家
+    best = max(scores)
+    winners = [i for i, score in enumerate(scores) if score == best]
+    share = 1 / len(winners)
+    for i in winners:
+        if i >= known_count:
+            continue
+        if len(winners) == 1:
+            wins[i] += 1
+        else:
+            ties[i] += 1
+        shares[i] += share
+        squares[i] += share * share
+
+
+def _simulate_multi_batch(hands, community_cards, num_unknown, simulations, seed=None):
+    # 多名已知手牌的玩家共享同一次模拟，num_unknown 名对手为随机手牌
+    # 返回 (wins, ties, shares, squares, simulations)，前四项为每名已知玩家一项的列表
+    dead = [card for hand in hands for card in hand] + community_cards
+    deck = Deck(dead, random.Random(seed))
+    needed = 5 - len(community_cards)
+    deal_count = needed + 2 * num_unknown
+    # 公牌状态只建立一次，每手牌通过 score_with 叠加
+    board = IncrementalEvaluator(community_cards)
+    known_count = len(hands)
+    wins = [0] * known_count
+    ties = [0] * known_count
+    shares = [0.0] * known_count
+    squares = [0.0] * known_count
+
+    for _ in range(simulations):
+        dealt = deck.deal(deal_count)
+        extra = dealt[:needed]
+        for card in extra:
+            board.add(card)
+        scores = [board.score_with(*hand) for hand in hands]
+        scores.extend(board.score_with(dealt[start], dealt[start + 1]) for start in range(needed, deal_count, 2))
+        for card in extra:
+            board.remove(card)
+        _settle_showdown(scores, known_count, wins, ties, shares, squares)
+
+    return wins, ties, shares, squares, simulations
+
+
+def _compare_batch(hands, community_cards, num_opponents, simulations, seed=None):
+    # 公共随机数: 每个样本的公牌补全和对手手牌对所有候选手牌都相同，各手牌分别与这些对手比牌
+    # 得分以半分为单位(胜2、平1、负0)。返回 (各手胜次数, 各手平局次数, 与第一手的得分差之和,
+    # 得分差的平方和, simulations)
+    dead = [card for hand in hands for card in hand] + community_cards
+    deck = Deck(dead, random.Random(seed))
+    needed = 5 - len(community_cards)
+    deal_count = needed + 2 * num_opponents
+    board = IncrementalEvaluator(community_cards)
+    count = len(hands)
+    wins = [0] * count
+    ties = [0] * count
+    diffs = [0] * count
+    diff_squares = [0] * count
+
+    for _ in range(simulations):
+        dealt = deck.deal(deal_count)
+        extra = dealt[:needed]
+        for card in extra:
+            board.add(card)
+        best_other = max(board.score_with(dealt[start], dealt[start + 1]) for start in range(needed, deal_count, 2))
+        points = []
+        for i, hand in enumerate(hands):
+            score = board.score_with(*hand)
+            if score > best_other:
+                wins[i] += 1
+                points.append(2)
+            elif score == best_other:
+                ties[i] += 1
+                points.append(1)
+            else:
+                points.append(0)
+        for card in extra:
+            board.remove(card)
+        for i in range(1, count):
+            diff = points[i] - points[0]
+            diffs[i] += diff
+            diff_squares[i] += diff * diff
+
+    return wins, ties, diffs, diff_squares, simulations
+
+
+def _enumerate_multi_batch(hands, community_cards, num_unknown, boards):
+    # 精确枚举 boards 中的每种公牌补全(仅用于没有随机对手的情形)
+    board = IncrementalEvaluator(community_cards)
+    known_count = len(hands)
+    wins = [0] * known_count
+    ties = [0] * known_count
+    shares = [0.0] * known_count
+    squares = [0.0] * known_count
+
+    for extra in boards:
+        for card in extra:
+            board.add(card)
+        _settle_showdown([board.score_with(*hand) for hand in hands], known_count, wins, ties, shares, squares)
+        for card in extra:
+            board.remove(card)
+
+    return wins, ties, shares, squares, len(boards)
+
+
+# 可选的模拟引擎及其批次大小
+_ENGINES = {
+    'python': (_simulate_batch, _BATCH_SIZE),
+    'numpy': (_simulate_batch_numpy, 10 * _BATCH_SIZE),
+}
+
+
+# 翻牌前胜率表(由 poker_preflop_table.py 离线生成)，按起手牌类别和玩家数量查询
+PREFLOP_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_equity.json')
+STARTING_HAND_RANKS = '23456789TJQKA'
+
+_preflop_table = None
+
+
+def starting_hand_label(cards):
+    # 两张手牌对应的起手牌类别，例如 AA, AKs, AKo
+    high, low = sorted(cards, key=lambda card: card.rank_value, reverse=True)
+    label = STARTING_HAND_RANKS[high.rank_value - 2] + STARTING_HAND_RANKS[low.rank_value - 2]
+    if high.rank_value == low.rank_value:
+        return label
+    return label + ('s' if high.suit == low.suit else 'o')
+
+
+def load_preflop_table(path=None):
+    # 首次使用时读取胜率表；文件不存在或无法解析时返回空表，计算会退回到模拟
+    global _preflop_table
+    if path is not None:
+        with open(path, encoding='utf-8') as f:
+            _preflop_table = json.load(f)
+    elif _preflop_table is None:
+        try:
+            with open(PREFLOP_TABLE_PATH, encoding='utf-8') as f:
+                _preflop_table = json.load(f)
+        except (OSError, ValueError):
+            _preflop_table = {}
+    return _preflop_table
+
+
+# 花色同构: 只交换花色的牌局胜率相同，对24种花色置换取字典序最小的表示作为规范形式
+_SUIT_PERMUTATIONS = list(permutations(range(4)))
+
+
+def canonical_cards(my_cards, community_cards):
+    # my_cards / community_cards 为整数序号，返回规范化后的 (手牌, 公牌) 元组
+    best = None
+    for perm in _SUIT_PERMUTATIONS:
+        hole = tuple(sorted(((card & ~3) | perm[card & 3] for card in my_cards), reverse=True))
+        board = tuple(sorted(((card & ~3) | perm[card & 3] for card in community_cards), reverse=True))
+        if best is None or (hole, board) < best:
+            best = (hole, board)
+    return best
+
+
+def canonical_query(num_players, my_cards, community_cards=(), simulations=10000):
+    # 把卡牌字符串形式的查询转换为规范形式，等价查询得到相同的结果
+    my_indices = [card.index for card in PokerWinRateCalculator.parse_cards(my_cards)]
+    community_indices = [card.index for card in PokerWinRateCalculator.parse_cards(community_cards)]
+    return canonical_cards(my_indices, community_indices) + (num_players, simulations)
+
+
+class EquityCache:
+    # 线程安全的 LRU 缓存，ttl(秒) 不为 None 时条目过期后视为未命中
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 所有计算器实例共享的结果缓存
+equity_cache = EquityCache()
+
+
+class CalculationCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    # 取消令牌: 任意线程调用 cancel() 后，使用该令牌的计算会在当前批次完成后抛出 CalculationCancelled
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CalculationCancelled("计算已取消")
+
+
+# 牌型类别(牌力整数的最高位)对应的名称
+HAND_CATEGORY_NAMES = {
+    1: '高牌', 2: '一对', 3: '两对', 4: '三条', 5: '顺子',
+    6: '同花', 7: '葫芦', 8: '四条', 9: '同花顺', 10: '皇家同花顺',
+}
+
+
+def hand_category(score):
+    return score >> 20
+
+
+class NextCardAnalysis:
+    # 翻牌或转牌后逐张枚举下一张公牌的结果
+    # cards 中每项为 (下一张牌, 发出后自己的牌力, 发出后的 EquityResult)
+    # weights 为与 cards 对应的各张牌出现的概率，默认在未知牌中均匀分布
+    def __init__(self, current_score, cards, weights=None):
+        self.current_score = current_score
+        self.cards = cards
+        if weights is None:
+            weights = [1 / len(cards)] * len(cards)
+        self.weights = weights
+        # 当前胜率即各张牌胜率按出现概率的加权平均
+        self.equity = sum(weight * result.win_rate for weight, (_, _, result) in zip(weights, cards))
+        current_category = hand_category(current_score)
+        improving = [(card, weight) for weight, (card, score, _) in zip(weights, cards)
+                     if hand_category(score) > current_category]
+        self.improving = [card for card, _ in improving]
+        # 补牌(outs): 让自己的牌型升级且胜率高于当前胜率的牌
+        outs = [(card, weight) for weight, (card, score, result) in zip(weights, cards)
+                if hand_category(score) > current_category and result.win_rate > self.equity]
+        self.outs = [card for card, _ in outs]
+        self.improve_probability = sum(weight for _, weight in improving)
+        self.out_probability = sum(weight for _, weight in outs)
+        # 发出下一张牌后各牌型的概率
+        self.category_probabilities = {}
+        for weight, (_, score, _) in zip(weights, cards):
+            name = HAND_CATEGORY_NAMES[hand_category(score)]
+            self.category_probabilities[name] = self.category_probabilities.get(name, 0) + weight
+
+    @property
+    def current_category(self):
+        return HAND_CATEGORY_NAMES[hand_category(self.current_score)]
+
+    def __repr__(self):
+        return (f"NextCardAnalysis(equity={self.equity:.4f}, current={self.current_category}, "
+                f"outs={len(self.outs)}, improve={self.improve_probability:.2%})")
+
+
+class EquityResult:
+    # 胜率计算结果: 胜率(平局计一半)、样本数、标准误差和置信区间
+    # share/share_square 为各样本得分之和与平方和(多人平局时按赢家人数均分)，默认按平局计一半
+    # total 为计算结束时预计的样本数，iter_equity 产出的中间快照中 samples 小于 total
+    # variance 为单个样本得分的方差，分层抽样时传入层内方差；默认由 share_square 计算
+    def __init__(self, wins, ties, samples, engine, confidence=0.95, share=None, share_square=None, total=None,
+                 variance=None):
+        self.wins = wins
+        self.ties = ties
+        self.samples = samples
+        self.total = samples if total is None else total
+        self.engine = engine
+        self.confidence = confidence
+        self.exact = engine == 'exact'
+
+        if share is None:
+            # 单次样本的得分为 1、0.5 或 0
+            share = wins + ties / 2
+            share_square = wins + ties / 4
+
+        if samples:
+            self.win_rate = share / samples
+            if variance is None:
+                # 由得分的平方和得到样本方差
+                mean_square = share_square / samples
+                variance = max(mean_square - self.win_rate ** 2, 0.0)
+            self.stderr = 0.0 if self.exact else sqrt(variance / samples)
+        else:
+            self.win_rate = 0
+            self.stderr = 0.0
+
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.ci_low = max(self.win_rate - z * self.stderr, 0.0)
+        self.ci_high = min(self.win_rate + z * self.stderr, 1.0)
+
+    @property
+    def tie_rate(self):
+        return self.ties / self.samples if self.samples else 0
+
+    @property
+    def ci_width(self):
+        return self.ci_high - self.ci_low
+
+    def __repr__(self):
+        return (f"EquityResult(win_rate={self.win_rate:.4f}, ci=({self.ci_low:.4f}, {self.ci_high:.4f}), "
+                f"samples={self.samples}, engine={self.engine!r})")
+
+
 class PokerWinRateCalculator:
     def __init__(self, num_players, my_cards):
         self.num_players = num_players
         self.my_cards = self.parse_cards(my_cards)
         self.community_cards = []
+        # 每名对手的手牌范围(poker_range.HandRange)，None 表示随机手牌
+        self.opponent_ranges = [None] * (num_players - 1)
+        # 最近一次 reuse_runouts=True 的 python 引擎模拟的 ((手牌, 公牌, 玩家数量), 样本)，公牌增加后筛选复用
+        self._saved_runouts = None
         
-    def parse_cards(self, card_strings):
+    @staticmethod
+    def parse_cards(card_strings):
         # 解析卡牌字符串为Card对象列表
         cards = []
         seen_cards = set()
@@ -166,8 +1118,7 @@ class PokerWinRateCalculator:
                 raise ValueError(f"无效的卡牌格式: {card_str}。正确格式如: As, Kd, 10h")
             
             # 验证点数
-            valid_ranks = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-            if rank not in valid_ranks:
+            if rank not in _RANK_VALUES:
                 raise ValueError(f"无效的点数: {rank}。有效点数: 2-10, J, Q, K, A")
                 
             # 验证花色
@@ -181,12 +1132,12 @@ class PokerWinRateCalculator:
                 suit = suit_map[suit]
                 
             # 检查重复卡牌
-            card_key = (rank, suit)
-            if card_key in seen_cards:
+            index = (_RANK_VALUES[rank] - 2) * 4 + _SUIT_INDEX[suit]
+            if index in seen_cards:
                 raise ValueError(f"卡牌重复: {rank}{suit}")
-            seen_cards.add(card_key)
+            seen_cards.add(index)
                 
-            cards.append(Card(rank, suit))
+            cards.append(CARDS[index])
         return cards
 
     def add_community_cards(self, community_cards):
@@ -207,89 +1158,619 @@ class PokerWinRateCalculator:
             
         self.community_cards.extend(new_cards)
     
-    def calculate_win_rate(self, simulations=10000, progress_callback=None):
-        # Monte Carlo simulation to calculate win rate
-        wins = 0
-        ties = 0
-        total_simulations = simulations
-    
-        # Check if there are enough community cards
+    @staticmethod
+    def suggest_workers(simulations):
+        # 模拟次数较多时使用全部CPU核心，较少时进程启动开销不划算
+        if simulations >= 100000:
+            return os.cpu_count() or 1
+        return 1
+
+    # 精确枚举的组合数不超过 模拟次数 x 该倍数 时，auto 引擎改用精确枚举；
+    # 枚举时每种公牌只评估一次自己的手牌，且无需随机发牌，单个组合的开销远低于一次模拟
+    exact_cost_ratio = 12
+
+    def set_opponent_ranges(self, ranges):
+        # ranges 可以是单个范围(应用于所有对手)或每名对手一项的列表，
+        # 每项为范围文本、poker_range.HandRange 或 None(随机手牌)
+        from poker_range import HandRange
+
+        if ranges is None or isinstance(ranges, (str, HandRange)):
+            ranges = [ranges] * (self.num_players - 1)
+        if len(ranges) != self.num_players - 1:
+            raise ValueError(f"需要为{self.num_players - 1}名对手各指定一个范围")
+        self.opponent_ranges = [HandRange(r) if isinstance(r, str) else r for r in ranges]
+
+    def has_opponent_ranges(self):
+        return any(r is not None for r in self.opponent_ranges)
+
+    def choose_engine(self, simulations):
+        # 根据已知公牌数量和玩家数量估算精确枚举的规模；指定了对手范围时只能模拟
+        if self.has_opponent_ranges():
+            return 'python'
+        unknown_cards = 52 - len(self.my_cards) - len(self.community_cards)
+        deals = _count_exact_deals(unknown_cards, 5 - len(self.community_cards), self.num_players - 1)
+        if deals <= simulations * self.exact_cost_ratio:
+            return 'exact'
+        return 'python'
+
+    def _plan_batches(self, simulations, engine, seed=None, record=False):
+        # 选择引擎并把计算拆分为批次，返回 (engine, run_batch, batches)
+        # batches 中每项为 (该批样本数, run_batch 的额外参数)；seed 见 _batch_seeds
+        # record=True 时 python 引擎的批次同时返回每个样本的公牌补全，供下一街复用
         if len(self.community_cards) > 5:
             raise ValueError("Community cards cannot exceed 5")
-    
-        start_time = time.time()
-        progress_bar = tqdm(range(simulations), desc="Simulation Progress", unit="sim", ncols=100)
-    
-        for i in progress_bar:
-            # Create new deck and remove known cards
-            deck = Deck()
-            for card in self.my_cards + self.community_cards:
-                deck.remove_card(card)
-    
-            # Deal hands to other players
-            other_players = []
-            for _ in range(self.num_players - 1):
-                if len(deck.cards) < 2:
-                    # Not enough cards, skip this simulation
-                    total_simulations -= 1
-                    continue
-                player_hand = [deck.draw(), deck.draw()]
-                other_players.append(player_hand)
-    
-            # Deal remaining community cards
-            remaining_community = []
-            needed = 5 - len(self.community_cards)
-            if len(deck.cards) < needed:
-                # Not enough cards, skip this simulation
-                total_simulations -= 1
+
+        my_cards = [card.index for card in self.my_cards]
+        community_cards = [card.index for card in self.community_cards]
+        num_opponents = self.num_players - 1
+        needed = 5 - len(community_cards)
+        unknown_cards = 52 - len(my_cards) - len(community_cards)
+        if needed + 2 * num_opponents > unknown_cards:
+            raise ValueError(f"剩余牌数不足以发给{self.num_players}名玩家")
+
+        if engine == 'auto':
+            engine = self.choose_engine(simulations)
+
+        prefix = (my_cards, community_cards, num_opponents)
+        if self.has_opponent_ranges() and engine != 'python':
+            raise ValueError("指定对手范围时只支持 python 引擎")
+
+        if engine == 'python' and self.has_opponent_ranges():
+            # 先去除与已知牌冲突的组合，再为每个范围构建别名表
+            dead = my_cards + community_cards
+            prefix = (my_cards, community_cards,
+                      [r.sampler(dead) if r is not None else None for r in self.opponent_ranges])
+            run_batch = _simulate_range_batch
+            seeds = _batch_seeds(seed, -(-simulations // _BATCH_SIZE))
+            batches = [(min(_BATCH_SIZE, simulations - start), (min(_BATCH_SIZE, simulations - start),
+                                                                seeds[start // _BATCH_SIZE]))
+                       for start in range(0, simulations, _BATCH_SIZE)]
+        elif engine == 'exact':
+            # 按公牌补全分批，每批的规模为其包含的组合数
+            dead = set(my_cards + community_cards)
+            boards = list(combinations([index for index in range(52) if index not in dead], needed))
+            deals_per_board = _count_exact_deals(unknown_cards - needed, 0, num_opponents)
+            chunk = max(1, _BATCH_SIZE // deals_per_board)
+            run_batch = _enumerate_batch
+            batches = [(len(boards[start:start + chunk]) * deals_per_board, (boards[start:start + chunk],))
+                       for start in range(0, len(boards), chunk)]
+        elif engine == 'stratified':
+            # 按接下来的 k 张公牌分层(翻牌后为转牌+河牌，转牌后为河牌，翻牌前为前几张翻牌)，
+            # 取每层至少2个样本时能容纳的最大 k；每个批次为一轮，各层样本数相同，中途停止也不会有偏
+            if needed == 0:
+                raise ValueError("公牌已全部发出，无法分层抽样")
+            unknown = [index for index in range(52) if index not in set(my_cards + community_cards)]
+            k = 1
+            while k < needed and comb(unknown_cards, k + 1) * 2 <= simulations:
+                k += 1
+            strata = list(combinations(unknown, k))
+            per_stratum = max(2, -(-simulations // len(strata)))
+            rounds = max(1, _BATCH_SIZE // len(strata))
+            seeds = _batch_seeds(seed, -(-per_stratum // rounds))
+            run_batch = _stratified_batch
+            batches = [(len(strata) * min(rounds, per_stratum - start),
+                        (strata, min(rounds, per_stratum - start), seeds[start // rounds]))
+                       for start in range(0, per_stratum, rounds)]
+        elif engine in _ENGINES:
+            run_batch, batch_size = _ENGINES[engine]
+            seeds = _batch_seeds(seed, -(-simulations // _BATCH_SIZE))
+            batches = []
+            for start in range(0, simulations, batch_size):
+                size = min(batch_size, simulations - start)
+                if engine == 'python':
+                    args = (size, seeds[start // _BATCH_SIZE], record)
+                elif seed is None:
+                    args = (size, seeds[start // _BATCH_SIZE])
+                else:
+                    # 指定种子时 numpy 引擎按段使用与 python 引擎相同的种子和发牌过程
+                    args = (size, None, tuple(seeds[start // _BATCH_SIZE:-(-(start + size) // _BATCH_SIZE)]))
+                batches.append((size, args))
+        else:
+            raise ValueError(f"未知的模拟引擎: {engine}。可选: auto, exact, stratified, {', '.join(_ENGINES)}")
+
+        return engine, run_batch, [(size, prefix + args) for size, args in batches]
+
+    def runout_state(self):
+        return (tuple(card.index for card in self.my_cards), tuple(card.index for card in self.community_cards),
+                self.num_players)
+
+    def consistent_runouts(self):
+        # 上次模拟的样本中，公牌补全包含之后新增公牌的那些仍服从当前牌局的分布(对手手牌与其余公牌
+        # 在剩余牌中均匀随机)，可以直接复用；牌局不是上次的延续时返回空数组
+        if self._saved_runouts is None:
+            return array('Q')
+        (hole, board, players), runouts = self._saved_runouts
+        current_hole, current_board, current_players = self.runout_state()
+        if hole != current_hole or players != current_players or current_board[:len(board)] != board:
+            return array('Q')
+        new_mask = 0
+        for card in current_board[len(board):]:
+            new_mask |= 1 << card
+        if not new_mask:
+            return runouts
+        return array('Q', [runout for runout in runouts if runout & new_mask == new_mask])
+
+    def canonical_state(self):
+        # 花色规范化后的 (手牌, 公牌, 玩家数量)，即持久化胜率库的键
+        hole, board = canonical_cards([card.index for card in self.my_cards],
+                                      [card.index for card in self.community_cards])
+        return hole, board, self.num_players
+
+    def canonical_key(self, simulations, *options):
+        # 结果缓存的键: 规范化的牌局、模拟次数及其他影响结果的参数
+        # 对手范围与具体花色相关，指定范围时使用未规范化的牌和范围文本
+        if self.has_opponent_ranges():
+            return (tuple(card.index for card in self.my_cards), tuple(card.index for card in self.community_cards),
+                    self.num_players, tuple(r.text if r is not None else None for r in self.opponent_ranges),
+                    simulations) + options
+        return self.canonical_state() + (simulations,) + options
+
+    def analyze_next_card(self, simulations=5000, workers=1, engine='auto', cache=equity_cache):
+        # 翻牌或转牌后枚举每一张可能的下一张公牌，给出发出后的牌力和胜率，
+        # 以及补牌数量、牌型升级概率和逐张胜率表
+        # 支持一名对手指定范围: 范围中的手牌会占用部分牌(card removal)，各张牌按不被该对手持有的概率加权，
+        # 不可能出现的牌不参与分析；多名对手指定范围时各张牌的概率没有简单的解析形式，不支持
+        if len(self.community_cards) not in (3, 4):
+            raise ValueError("只能在翻牌后或转牌后分析下一张牌")
+        known = [card.index for card in self.my_cards + self.community_cards]
+        ranges = [r for r in self.opponent_ranges if r is not None]
+        if len(ranges) > 1:
+            raise ValueError("多名对手指定范围时不支持下一张牌分析")
+        # 各张牌出现的相对概率: 随机手牌的对手对所有未知牌是对称的，只需考虑范围占用的牌
+        card_weights = [0.0 if index in known else 1.0 for index in range(52)]
+        if ranges:
+            combos = ranges[0].combos(known)
+            if not combos:
+                raise ValueError("范围中没有可用的手牌组合")
+            total = sum(weight for _, weight in combos)
+            for (a, b), weight in combos:
+                card_weights[a] -= weight / total
+                card_weights[b] -= weight / total
+        # 已知牌的状态只建立一次，每张候选牌只需叠加后查表
+        hero = IncrementalEvaluator(known)
+        current_score = hero.score()
+
+        cards = []
+        weights = []
+        for index in range(52):
+            # 浮点误差内为0的牌(已知牌或范围中每手牌都包含的牌)不可能出现
+            if card_weights[index] <= 1e-12:
                 continue
-            for _ in range(needed):
-                remaining_community.append(deck.draw())
-    
-            # Evaluate my hand
-            my_full_hand = self.my_cards + self.community_cards + remaining_community
-            my_score = HandEvaluator.evaluate_hand(my_full_hand)
-    
-            # Evaluate other players' hands
-            other_scores = []
-            for hand in other_players:
-                full_hand = hand + self.community_cards + remaining_community
-                other_scores.append(HandEvaluator.evaluate_hand(full_hand))
-    
-            # Compare results
-            if all(my_score > score for score in other_scores):
-                wins += 1
-            elif any(my_score == score for score in other_scores):
-                ties += 1
-    
-            # Update progress callback every 100 simulations
-            if progress_callback and i % 100 == 0:
-                progress_callback(i + 1, simulations)
-    
-            # Update progress bar info
-            elapsed_time = time.time() - start_time
-            iterations_done = i + 1
-            if iterations_done > 0:
-                avg_time_per_iter = elapsed_time / iterations_done
-                remaining_iter = simulations - iterations_done
-                eta_seconds = remaining_iter * avg_time_per_iter
-    
-                # Format ETA time
-                eta_str = time.strftime('%H:%M:%S', time.gmtime(eta_seconds))
-                progress_bar.set_postfix_str(f"Win Rate: {wins/iterations_done:.2%}, ETA: {eta_str}")
-    
-        # Final progress update
+            card = CARDS[index]
+            score = hero.score_with(index)
+            calculator = copy.copy(self)
+            calculator.community_cards = self.community_cards + [card]
+            calculator._saved_runouts = None
+            result = calculator.calculate_equity(simulations, workers=workers, engine=engine, cache=cache)
+            cards.append((card, score, result))
+            weights.append(card_weights[index])
+        total = sum(weights)
+        return NextCardAnalysis(current_score, cards, [weight / total for weight in weights])
+
+    def lookup_preflop(self):
+        # 翻牌前直接查表，返回 EquityResult；不是翻牌前或表中没有对应项时返回 None
+        if self.community_cards or len(self.my_cards) != 2 or self.has_opponent_ranges():
+            return None
+        table = load_preflop_table()
+        players = table.get('players', [])
+        row = table.get('hands', {}).get(starting_hand_label(self.my_cards))
+        if not row or self.num_players not in players:
+            return None
+        win, tie = row[players.index(self.num_players)]
+        samples = table['simulations']
+        return EquityResult(round(win * samples), round(tie * samples), samples, 'table')
+
+    @staticmethod
+    def _run_batches(run_batch, batches, workers, ordered=False):
+        # 依次产出每个批次的 (wins, ties, count)；提前结束迭代时取消尚未开始的批次
+        # ordered=True 时多进程也按批次顺序产出，自适应停止的位置因此与进程数无关
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers > 1 and len(batches) > 1:
+            pool = _get_process_pool(workers)
+            futures = [pool.submit(run_batch, *args) for _, args in batches]
+            try:
+                for future in (futures if ordered else as_completed(futures)):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+        else:
+            for _, args in batches:
+                yield run_batch(*args)
+
+    def calculate_equity(self, simulations=10000, progress_callback=None, workers=1, engine='auto',
+                         target_stderr=None, target_ci_width=None, confidence=0.95, cache=equity_cache,
+                         store=None, reporter=None, cancel_token=None, seed=None, reuse_runouts=False):
+        # 计算胜率并返回 EquityResult
+        # workers > 1 时按批次分配到进程池，每个批次使用独立的随机种子
+        # engine: 'python'(逐次模拟)、'numpy'(整批向量化模拟，需要安装 NumPy)、
+        # 'exact'(精确枚举所有剩余公牌和对手手牌)、'stratified'(按接下来的公牌分层抽样，方差更小) 或
+        # 'auto'(状态空间足够小时精确枚举，否则 python)
+        # 指定 target_stderr 或 target_ci_width 时，simulations 为模拟次数上限，
+        # 估计值的标准误差或置信区间宽度达到目标后立即停止
+        # engine='auto' 且处于翻牌前时，若胜率表的精度不低于本次请求则直接查表返回
+        # cache 为 EquityCache，花色同构的相同请求直接返回缓存结果；传入 None 不使用缓存
+        # store 为 poker_equity_store.EquityStore 等持久化胜率库: 库中已有足够样本时直接返回，
+        # 否则只补充不足的模拟次数，并把新样本累加回库中
+        # progress_callback(已完成样本数, 预计总样本数) 在每个批次完成后调用
+        # reporter 为 poker_progress 中的进度报告器(如命令行的 TqdmReporter)，默认不报告进度
+        # cancel_token 为 CancellationToken，取消后在批次之间抛出 CalculationCancelled，尚未开始的批次不再执行
+        # seed 为整数时结果可复现: 相同的 seed 在单进程和多进程下、python 与 numpy 引擎之间结果逐位一致；
+        # 此时不复用上一街的样本、不读写胜率库，缓存也只在完全相同的牌(不做花色规范化)之间共享
+        # reuse_runouts=True 时 python 引擎记录每个样本的公牌补全(约慢10%~20%)，同一个计算器添加公牌
+        # 或在同一街再次计算时复用其中仍然有效的样本；只在逐街计算同一牌局(如命令行)时值得开启
+        reporters = []
+        if reporter is not None:
+            reporters.append(reporter)
         if progress_callback:
-            progress_callback(simulations, simulations)
-    
-        if total_simulations == 0:
-            return 0
-    
-        # Calculate win rate, counting ties as half a win
-        win_rate = (wins + ties / 2) / total_simulations
-        return win_rate
+            reporters.append(CallbackReporter(progress_callback))
+        result = None
+        snapshots = self.iter_equity(simulations, workers, engine, target_stderr, target_ci_width,
+                                     confidence, cache, store, cancel_token=cancel_token, seed=seed,
+                                     reuse_runouts=reuse_runouts)
+        try:
+            for result in snapshots:
+                for r in reporters:
+                    r.report(result)
+        finally:
+            snapshots.close()
+            for r in reporters:
+                r.close()
+        return result
+
+    def iter_equity(self, simulations=10000, workers=1, engine='auto', target_stderr=None, target_ci_width=None,
+                    confidence=0.95, cache=equity_cache, store=None, interval=None, cancel_token=None, seed=None,
+                    reuse_runouts=False):
+        # calculate_equity 的生成器版本: 计算过程中逐步产出 EquityResult 快照(样本数、胜/平次数、
+        # 当前胜率和置信区间)，最后一个快照即最终结果；参数含义同 calculate_equity
+        # interval 为相邻两个快照之间至少间隔的样本数(按批次对齐)，None 表示每个批次产出一次
+        # 调用方中途 break 或 cancel_token 被取消即停止计算，尚未开始的批次会被取消，已完成的模拟样本仍会写入胜率库(未完成的精确枚举不写入)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        cache_key = None
+        if cache is not None:
+            cache_key = self.canonical_key(simulations, engine, target_stderr, target_ci_width, confidence)
+            if seed is not None:
+                cache_key += (seed, self.runout_state())
+            result = cache.get(cache_key)
+            if result is not None:
+                yield result
+                return
+
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        adaptive = target_stderr is not None or target_ci_width is not None
+
+        def precise_enough(stderr):
+            if target_stderr is not None and stderr <= target_stderr:
+                return True
+            return target_ci_width is not None and 2 * z * stderr <= target_ci_width
+
+        def finish(result):
+            if cache_key is not None:
+                cache.put(cache_key, result)
+            return result
+
+        if engine == 'auto':
+            result = self.lookup_preflop()
+            if result is not None and (result.samples >= simulations or (adaptive and precise_enough(result.stderr))):
+                yield finish(EquityResult(result.wins, result.ties, result.samples, result.engine, confidence))
+                return
+        if engine == 'auto':
+            engine = self.choose_engine(simulations)
+
+        # 库中已有的模拟样本作为起点，只补充不足的部分
+        prior_wins = 0
+        prior_ties = 0
+        prior_samples = 0
+        # 胜率库只保存对手为随机手牌的结果；指定种子时不读写胜率库，否则结果不可复现，
+        # 且相同种子导出的样本会被重复累加到库中
+        if self.has_opponent_ranges() or seed is not None:
+            store = None
+        if store is not None:
+            state = self.canonical_state()
+            stored = store.get(state)
+            if stored is not None:
+                stored_wins, stored_ties, stored_samples, stored_exact = stored
+                result = EquityResult(stored_wins, stored_ties, stored_samples,
+                                      'exact' if stored_exact else 'store', confidence)
+                if stored_exact or stored_samples >= simulations or (adaptive and precise_enough(result.stderr)):
+                    yield finish(result)
+                    return
+                # 分层抽样的方差只对本次的分层样本成立，不与库中的样本合并
+                if engine not in ('exact', 'stratified'):
+                    prior_wins, prior_ties, prior_samples = stored_wins, stored_ties, stored_samples
+
+        # python 引擎: 上一街的样本中与新公牌一致的部分作为起点，只补充不足的部分
+        runouts = array('Q')
+        record = (reuse_runouts and engine == 'python' and not prior_samples and not self.has_opponent_ranges()
+                  and seed is None)
+        if record:
+            runouts = self.consistent_runouts()
+            for runout in runouts:
+                if runout >= _RUNOUT_TIE:
+                    prior_ties += 1
+                elif runout >= _RUNOUT_WIN:
+                    prior_wins += 1
+            prior_samples = len(runouts)
+            self._saved_runouts = (self.runout_state(), runouts)
+            result = EquityResult(prior_wins, prior_ties, prior_samples, engine, confidence)
+            if prior_samples and (prior_samples >= simulations or (adaptive and precise_enough(result.stderr))):
+                yield finish(result)
+                return
+
+        engine, run_batch, batches = self._plan_batches(simulations - prior_samples, engine, seed, record)
+        total = prior_samples + sum(size for size, _ in batches)
+        adaptive = adaptive and engine != 'exact'
+
+        wins = prior_wins
+        ties = prior_ties
+        samples = prior_samples
+        variance = None
+        # 分层抽样时各层的累计胜/平次数
+        stratum_wins = None
+        stratum_ties = None
+        next_snapshot = samples + (interval or 0)
+        results = self._run_batches(run_batch, batches, workers, ordered=seed is not None)
+
+        try:
+            for batch in results:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                batch_wins, batch_ties, size = batch[:3]
+                wins += batch_wins
+                ties += batch_ties
+                samples += size
+                if engine == 'stratified':
+                    if stratum_wins is None:
+                        stratum_wins = array('Q', batch[3])
+                        stratum_ties = array('Q', batch[4])
+                    else:
+                        for h in range(len(stratum_wins)):
+                            stratum_wins[h] += batch[3][h]
+                            stratum_ties[h] += batch[4][h]
+                    variance = _stratified_variance(stratum_wins, stratum_ties, samples)
+                elif len(batch) > 3:
+                    runouts.extend(batch[3])
+                result = EquityResult(wins, ties, samples, engine, confidence, total=total, variance=variance)
+
+                # 自适应模式: 至少积累 _MIN_ADAPTIVE_SAMPLES 个样本后检查精度目标
+                if adaptive and samples >= _MIN_ADAPTIVE_SAMPLES and precise_enough(result.stderr):
+                    break
+                if samples < total and samples >= next_snapshot:
+                    next_snapshot = samples + (interval or 0)
+                    yield result
+        finally:
+            results.close()
+            # 精确枚举按公牌顺序分批，中途停止(调用方提前结束或取消)时的部分结果不是随机样本，不写入胜率库
+            if store is not None and samples > prior_samples and (engine != 'exact' or samples == total):
+                store.add(state, wins - prior_wins, ties - prior_ties, samples - prior_samples,
+                          exact=engine == 'exact')
+
+        yield finish(EquityResult(wins, ties, samples, engine, confidence, variance=variance))
+
+    def calculate_player_sweep(self, simulations=10000, workers=1, engine='python', confidence=0.95, seed=None,
+                               max_players=None):
+        # 用同一组样本计算玩家总数为 2..max_players(默认 num_players) 时的胜率，返回 {玩家数量: EquityResult}
+        # 每个样本发出最多的对手并逐个只评估一次，前 k 名对手即为 k+1 人桌的结果，
+        # 总开销约等于一次 max_players 人的模拟；不同玩家数量的结果使用公共随机数，差值更稳定
+        # engine: 'python' 或 'numpy'；seed 含义同 calculate_equity
+        if self.has_opponent_ranges():
+            raise ValueError("指定对手范围时不支持按玩家数量扫描")
+        max_players = max_players or self.num_players
+        if not 2 <= max_players <= 10:
+            raise ValueError("玩家总数必须在2到10之间")
+        my_cards = [card.index for card in self.my_cards]
+        community_cards = [card.index for card in self.community_cards]
+        num_opponents = max_players - 1
+        if 5 - len(community_cards) + 2 * num_opponents > 52 - len(my_cards) - len(community_cards):
+            raise ValueError(f"剩余牌数不足以发给{max_players}名玩家")
+
+        prefix = (my_cards, community_cards, num_opponents)
+        seeds = _batch_seeds(seed, -(-simulations // _BATCH_SIZE))
+        if engine == 'python':
+            run_batch = _sweep_batch
+            batches = [(None, prefix + (min(_BATCH_SIZE, simulations - start), seeds[start // _BATCH_SIZE]))
+                       for start in range(0, simulations, _BATCH_SIZE)]
+        elif engine == 'numpy':
+            run_batch = _simulate_batch_numpy
+            batch_size = _ENGINES['numpy'][1]
+            batches = []
+            for start in range(0, simulations, batch_size):
+                size = min(batch_size, simulations - start)
+                if seed is None:
+                    args = (size, seeds[start // _BATCH_SIZE], None, True)
+                else:
+                    args = (size, None, tuple(seeds[start // _BATCH_SIZE:-(-(start + size) // _BATCH_SIZE)]), True)
+                batches.append((None, prefix + args))
+        else:
+            raise ValueError(f"按玩家数量扫描只支持 python 和 numpy 引擎，不支持: {engine}")
+
+        wins = [0] * num_opponents
+        ties = [0] * num_opponents
+        samples = 0
+        for batch_wins, batch_ties, size in self._run_batches(run_batch, batches, workers, ordered=seed is not None):
+            for k in range(num_opponents):
+                wins[k] += batch_wins[k]
+                ties[k] += batch_ties[k]
+            samples += size
+        return {k + 2: EquityResult(wins[k], ties[k], samples, engine, confidence) for k in range(num_opponents)}
+
+    def calculate_win_rate(self, simulations=10000, progress_callback=None, workers=1, engine='auto',
+                           target_stderr=None, target_ci_width=None, seed=None):
+        # Monte Carlo simulation to calculate win rate, counting ties as half a win
+        # 参数含义同 calculate_equity，只返回胜率
+        return self.calculate_equity(simulations, progress_callback, workers, engine,
+                                     target_stderr, target_ci_width, seed=seed).win_rate
+
+
+class MultiHandCalculator:
+    # 多名玩家亮牌(例如全下后摊牌)时，在同一次模拟中计算每名已知玩家的胜率；
+    # 另有 num_unknown 名对手持随机手牌，只参与比牌，不单独统计
+    def __init__(self, hands, num_unknown=0):
+        if len(hands) < 1:
+            raise ValueError("至少需要一手已知手牌")
+        if not 2 <= len(hands) + num_unknown <= 10:
+            raise ValueError("玩家总数必须在2到10之间")
+        self.hands = [PokerWinRateCalculator.parse_cards(hand) for hand in hands]
+        self.num_unknown = num_unknown
+        self.community_cards = []
+        self._check_duplicates(self.all_known_cards())
+
+    def all_known_cards(self):
+        return [card for hand in self.hands for card in hand] + self.community_cards
+
+    @staticmethod
+    def _check_duplicates(cards):
+        seen = set()
+        for card in cards:
+            if card in seen:
+                raise ValueError(f"卡牌重复: {card}")
+            seen.add(card)
+
+    def add_community_cards(self, community_cards):
+        new_cards = PokerWinRateCalculator.parse_cards(community_cards)
+        if len(self.community_cards) + len(new_cards) > 5:
+            raise ValueError(f"公牌总数不能超过5张，当前已有{len(self.community_cards)}张")
+        self._check_duplicates(self.all_known_cards() + new_cards)
+        self.community_cards.extend(new_cards)
+
+    def choose_engine(self, simulations):
+        # 没有随机对手且剩余公牌组合数不超过模拟次数时精确枚举
+        if self.num_unknown:
+            return 'python'
+        unknown_cards = 52 - len(self.all_known_cards())
+        if comb(unknown_cards, 5 - len(self.community_cards)) <= simulations:
+            return 'exact'
+        return 'python'
+
+    def calculate_equity(self, simulations=10000, progress_callback=None, workers=1, engine='auto',
+                         confidence=0.95, seed=None):
+        # 返回每手已知手牌一项的 EquityResult 列表；多人平局时底池按赢家人数均分
+        # seed 含义同 PokerWinRateCalculator.calculate_equity
+        # engine: 'python'、'exact'(仅限没有随机对手时) 或 'auto'
+        hands = [[card.index for card in hand] for hand in self.hands]
+        community_cards = [card.index for card in self.community_cards]
+        needed = 5 - len(community_cards)
+        unknown_cards = 52 - len(self.all_known_cards())
+        if needed + 2 * self.num_unknown > unknown_cards:
+            raise ValueError("剩余牌数不足以发给所有玩家")
+
+        if engine == 'auto':
+            engine = self.choose_engine(simulations)
+        prefix = (hands, community_cards, self.num_unknown)
+        if engine == 'exact':
+            if self.num_unknown:
+                raise ValueError("有随机对手时不支持精确枚举")
+            dead = {card for hand in hands for card in hand} | set(community_cards)
+            boards = list(combinations([index for index in range(52) if index not in dead], needed))
+            batches = [(boards[start:start + _BATCH_SIZE],) for start in range(0, len(boards), _BATCH_SIZE)]
+            run_batch = _enumerate_multi_batch
+            total = len(boards)
+        elif engine == 'python':
+            seeds = _batch_seeds(seed, -(-simulations // _BATCH_SIZE))
+            batches = [(min(_BATCH_SIZE, simulations - start), seeds[start // _BATCH_SIZE])
+                       for start in range(0, simulations, _BATCH_SIZE)]
+            run_batch = _simulate_multi_batch
+            total = simulations
+        else:
+            raise ValueError(f"未知的模拟引擎: {engine}。可选: auto, exact, python")
+
+        known_count = len(hands)
+        wins = [0] * known_count
+        ties = [0] * known_count
+        shares = [0.0] * known_count
+        squares = [0.0] * known_count
+        samples = 0
+        batches = [(None, prefix + args) for args in batches]
+        for batch in PokerWinRateCalculator._run_batches(run_batch, batches, workers, ordered=seed is not None):
+            for totals, values in zip((wins, ties, shares, squares), batch[:4]):
+                for i, value in enumerate(values):
+                    totals[i] += value
+            samples += batch[4]
+            if progress_callback:
+                progress_callback(samples, total)
+
+        return [EquityResult(wins[i], ties[i], samples, engine, confidence, shares[i], squares[i])
+                for i in range(known_count)]
+
+
+
+class EquityDifference:
+    # 两手牌胜率之差(平局计一半)及其标准误差和置信区间，由成对样本的得分差得到
+    def __init__(self, total, total_square, samples, confidence=0.95):
+        self.samples = samples
+        self.confidence = confidence
+        self.difference = total / samples if samples else 0.0
+        variance = max(total_square / samples - self.difference ** 2, 0.0) if samples else 0.0
+        self.stderr = sqrt(variance / samples) if samples else 0.0
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.ci_low = self.difference - z * self.stderr
+        self.ci_high = self.difference + z * self.stderr
+
+    def __repr__(self):
+        return (f"EquityDifference(difference={self.difference:+.4f}, ci=({self.ci_low:+.4f}, {self.ci_high:+.4f}), "
+                f"samples={self.samples})")
+
+
+class HandComparison:
+    # 用公共随机数比较几手候选手牌(例如在同一牌面下比较 AKo 与 AQs): 每个样本的公牌补全和对手手牌
+    # 对所有候选手牌相同，各手牌分别与这些对手比牌。两手牌胜率之差的方差远小于分别独立模拟后相减，
+    # 达到相同精度所需的样本数少得多。所有候选手牌都不进入牌堆，胜率以其他候选牌已被移除为条件
+    def __init__(self, num_players, hands):
+        if len(hands) < 2:
+            raise ValueError("至少需要两手候选手牌")
+        if not 2 <= num_players <= 10:
+            raise ValueError("玩家总数必须在2到10之间")
+        self.num_players = num_players
+        self.hands = [PokerWinRateCalculator.parse_cards(hand) for hand in hands]
+        self.community_cards = []
+        MultiHandCalculator._check_duplicates(self.all_known_cards())
+
+    def all_known_cards(self):
+        return [card for hand in self.hands for card in hand] + self.community_cards
+
+    def add_community_cards(self, community_cards):
+        new_cards = PokerWinRateCalculator.parse_cards(community_cards)
+        if len(self.community_cards) + len(new_cards) > 5:
+            raise ValueError(f"公牌总数不能超过5张，当前已有{len(self.community_cards)}张")
+        MultiHandCalculator._check_duplicates(self.all_known_cards() + new_cards)
+        self.community_cards.extend(new_cards)
+
+    def compare(self, simulations=10000, workers=1, confidence=0.95, seed=None):
+        # 返回 (results, differences): results 为每手牌一项的 EquityResult，
+        # differences[i - 1] 为第 i 手牌与第一手牌的 EquityDifference；seed 含义同 calculate_equity
+        hands = [[card.index for card in hand] for hand in self.hands]
+        community_cards = [card.index for card in self.community_cards]
+        num_opponents = self.num_players - 1
+        if 5 - len(community_cards) + 2 * num_opponents > 52 - len(self.all_known_cards()):
+            raise ValueError("剩余牌数不足以发给所有玩家")
+
+        seeds = _batch_seeds(seed, -(-simulations // _BATCH_SIZE))
+        batches = [(None, (hands, community_cards, num_opponents, min(_BATCH_SIZE, simulations - start),
+                           seeds[start // _BATCH_SIZE]))
+                   for start in range(0, simulations, _BATCH_SIZE)]
+        count = len(hands)
+        wins = [0] * count
+        ties = [0] * count
+        diffs = [0] * count
+        diff_squares = [0] * count
+        samples = 0
+        for batch in PokerWinRateCalculator._run_batches(_compare_batch, batches, workers, ordered=seed is not None):
+            for totals, values in zip((wins, ties, diffs, diff_squares), batch[:4]):
+                for i, value in enumerate(values):
+                    totals[i] += value
+            samples += batch[4]
+
+        results = [EquityResult(wins[i], ties[i], samples, 'python', confidence) for i in range(count)]
+        # 得分差以半分为单位累计
+        differences = [EquityDifference(diffs[i] / 2, diff_squares[i] / 4, samples, confidence)
+                       for i in range(1, count)]
+        return results, differences
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     print("=" * 40)
     print("说明: 输入卡牌时使用点数+花色的格式，例如: As(黑桃A), Kd(方块K)")
     print("花色: s=黑桃♠, h=红桃♥, d=方块♦, c=梅花♣")
@@ -329,9 +1810,11 @@ if __name__ == "__main__":
         print("2. 平衡模式 (10,000次模拟) - 默认选项")
         print("3. 精确模式 (100,000次模拟) - 最高精度")
         print("4. 自定义次数")
+        print("5. 自适应模式 (95%置信区间达到±0.5%即停止，最多1,000,000次模拟)")
         
+        target_ci_width = None
         while True:
-            precision_choice = input("请输入选项 (1-4): ")
+            precision_choice = input("请输入选项 (1-5): ")
             if precision_choice == '1':
                 simulations = 1000
                 break
@@ -349,13 +1832,21 @@ if __name__ == "__main__":
                     print("请输入100到1,000,000之间的数字")
                 except ValueError:
                     print("请输入有效的数字")
+            elif precision_choice == '5':
+                simulations = 1000000
+                target_ci_width = 0.01
+                break
             else:
-                print("请输入1-4之间的选项")
+                print("请输入1-5之间的选项")
         
+        # 模拟次数较多时启用多进程
+        workers = PokerWinRateCalculator.suggest_workers(simulations)
+
         # 初始胜率（翻牌前）
         print("\n--- 翻牌前状态 ---")
-        win_rate = calculator.calculate_win_rate(simulations)
-        print(f"当前胜率: {win_rate:.2%} (模拟次数: {simulations})")
+        result = calculator.calculate_equity(simulations, workers=workers, target_ci_width=target_ci_width,
+                                             reporter=TqdmReporter(), reuse_runouts=True)
+        print(f"当前胜率: {result.win_rate:.2%} ±{result.ci_width / 2:.2%} (模拟次数: {result.samples})")
         
         # 翻牌阶段（3张公牌）
         while True:
@@ -371,8 +1862,9 @@ if __name__ == "__main__":
         
         print("\n--- 翻牌后状态 ---")
         print(f"当前公牌: {', '.join(str(c) for c in calculator.community_cards)}")
-        win_rate = calculator.calculate_win_rate(simulations)
-        print(f"当前胜率: {win_rate:.2%} (模拟次数: {simulations})")
+        result = calculator.calculate_equity(simulations, workers=workers, target_ci_width=target_ci_width,
+                                             reporter=TqdmReporter(), reuse_runouts=True)
+        print(f"当前胜率: {result.win_rate:.2%} ±{result.ci_width / 2:.2%} (模拟次数: {result.samples})")
         
         # 转牌阶段（1张公牌）
         while True:
@@ -388,8 +1880,9 @@ if __name__ == "__main__":
         
         print("\n--- 转牌后状态 ---")
         print(f"当前公牌: {', '.join(str(c) for c in calculator.community_cards)}")
-        win_rate = calculator.calculate_win_rate(simulations)
-        print(f"当前胜率: {win_rate:.2%} (模拟次数: {simulations})")
+        result = calculator.calculate_equity(simulations, workers=workers, target_ci_width=target_ci_width,
+                                             reporter=TqdmReporter(), reuse_runouts=True)
+        print(f"当前胜率: {result.win_rate:.2%} ±{result.ci_width / 2:.2%} (模拟次数: {result.samples})")
         
         # 河牌阶段（1张公牌）
         while True:
@@ -405,7 +1898,9 @@ if __name__ == "__main__":
         
         print("\n--- 河牌后状态 ---")
         print(f"当前公牌: {', '.join(str(c) for c in calculator.community_cards)}")
-        win_rate = calculator.calculate_win_rate(simulations)
+        result = calculator.calculate_equity(simulations, workers=workers, target_ci_width=target_ci_width,
+                                             reporter=TqdmReporter(), reuse_runouts=True)
+        win_rate = result.win_rate
         try:
             # 计算胜率优势倍数（当前胜率 / 平均胜率）
             avg_win_rate = 1 / calculator.num_players
@@ -421,12 +1916,12 @@ if __name__ == "__main__":
             else:
                 strategy = "建议弃牌"
             
-            print(f"最终结果: 胜率 {win_rate:.2%}, 优势倍数 {win_advantage:.1f}x (模拟次数: {simulations})\n")
+            print(f"最终结果: 胜率 {win_rate:.2%}, 优势倍数 {win_advantage:.1f}x (模拟次数: {result.samples})\n")
             print(f"策略建议: {strategy} (基于{calculator.num_players}名玩家的竞争环境)\n")
             print("优势倍数说明: >1.0x表示高于平均水平，数值越大优势越明显；<1.0x表示低于平均水平\n")
         except Exception as e:
             print(f"结果计算出错: {str(e)}")
-            print(f"最终胜率: {win_rate:.2%} (模拟次数: {simulations})\n")
+            print(f"最终胜率: {win_rate:.2%} (模拟次数: {result.samples})\n")
         
     except KeyboardInterrupt:
         print("\n程序已被用户中断")
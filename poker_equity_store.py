@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import threading
+import time
+
+# 持久化的胜率库: 以花色规范化后的牌局 (手牌, 公牌, 玩家数量) 为键，
+# 累加保存多次计算的胜/平/样本数，多个进程可以同时读写同一个数据库文件
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.poker_equity.sqlite3')
+
+
+class EquityStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        # sqlite3 连接不能跨线程使用，每个线程各自持有一个连接
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS equity (
+                    hole TEXT NOT NULL,
+                    board TEXT NOT NULL,
+                    players INTEGER NOT NULL,
+                    wins INTEGER NOT NULL,
+                    ties INTEGER NOT NULL,
+                    samples INTEGER NOT NULL,
+                    exact INTEGER NOT NULL DEFAULT 0,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (hole, board, players)
+                )
+            """)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            # WAL 模式下读写互不阻塞，适合多个进程并发访问
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(state):
+        # state 为 PokerWinRateCalculator.canonical_state() 的返回值
+        hole, board, players = state
+        return ','.join(map(str, hole)), ','.join(map(str, board)), players
+
+    def get(self, state):
+        # 返回 (wins, ties, samples, exact)，没有记录时返回 None
+        row = self._connection().execute(
+            "SELECT wins, ties, samples, exact FROM equity WHERE hole = ? AND board = ? AND players = ?",
+            self._encode(state)).fetchone()
+        if row is None:
+            return None
+        wins, ties, samples, exact = row
+        return wins, ties, samples, bool(exact)
+
+    def add(self, state, wins, ties, samples, exact=False):
+        # 模拟结果累加到已有记录；精确枚举的结果直接替换，之后不再累加模拟样本
+        hole, board, players = self._encode(state)
+        with self._connection() as conn:
+            if exact:
+                conn.execute(
+                    "INSERT OR REPLACE INTO equity VALUES (?, ?, ?, ?, ?, ?, 1, ?)",
+                    (hole, board, players, wins, ties, samples, time.time()))
+            else:
+                conn.execute("""
+                    INSERT INTO equity VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+                    ON CONFLICT (hole, board, players) DO UPDATE SET
+                        wins = wins + excluded.wins,
+                        ties = ties + excluded.ties,
+                        samples = samples + excluded.samples,
+                        updated = excluded.updated
+                    WHERE exact = 0
+                """, (hole, board, players, wins, ties, samples, time.time()))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
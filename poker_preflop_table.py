@@ -0,0 +1,64 @@
+import argparse
+import json
+import time
+
+from poker_calculator import PREFLOP_TABLE_PATH, PokerWinRateCalculator, STARTING_HAND_RANKS
+
+# 离线生成翻牌前胜率表: 169种起手牌 x 2-10名玩家
+# 用法: python poker_preflop_table.py --simulations 200000 --engine numpy
+
+
+def starting_hand_labels():
+    # 按 AA, AKs, AKo, ... 的顺序列出169种起手牌
+    labels = []
+    ranks = STARTING_HAND_RANKS[::-1]
+    for i, high in enumerate(ranks):
+        labels.append(high + high)
+        for low in ranks[i + 1:]:
+            labels.append(high + low + 's')
+            labels.append(high + low + 'o')
+    return labels
+
+
+def representative_cards(label):
+    # 为起手牌类别挑选一组具体的牌，例如 AKs -> As Ks, AKo -> As Kh
+    high = label[0].replace('T', '10')
+    low = label[1].replace('T', '10')
+    if len(label) == 2 or label[2] == 'o':
+        return [f"{high}s", f"{low}h"]
+    return [f"{high}s", f"{low}s"]
+
+
+def build_table(simulations, players=range(2, 11), engine='numpy', workers=1):
+    hands = {}
+    start_time = time.time()
+    labels = starting_hand_labels()
+    for count, label in enumerate(labels, start=1):
+        row = []
+        for num_players in players:
+            calculator = PokerWinRateCalculator(num_players, representative_cards(label))
+            result = calculator.calculate_equity(simulations, workers=workers, engine=engine)
+            row.append([round(result.wins / result.samples, 6), round(result.ties / result.samples, 6)])
+        hands[label] = row
+        print(f"[{count}/{len(labels)}] {label}: " + ", ".join(f"{w + t / 2:.2%}" for w, t in row)
+              + f" (已用时 {time.time() - start_time:.0f} 秒)")
+    return {
+        'simulations': simulations,
+        'players': list(players),
+        # 每名玩家数量下为 [胜率, 平局率]，不含平局折半
+        'hands': hands,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成翻牌前胜率表")
+    parser.add_argument('--simulations', type=int, default=200000, help="每种起手牌、每个玩家数量的模拟次数")
+    parser.add_argument('--engine', default='numpy', help="模拟引擎: numpy 或 python")
+    parser.add_argument('--workers', type=int, default=1, help="模拟使用的进程数")
+    parser.add_argument('--output', default=PREFLOP_TABLE_PATH, help="输出的JSON文件路径")
+    args = parser.parse_args()
+
+    table = build_table(args.simulations, engine=args.engine, workers=args.workers)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(table, f, separators=(',', ':'))
+    print(f"已写入 {args.output}")
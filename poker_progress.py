@@ -0,0 +1,70 @@
+import logging
+import time
+
+# 计算进度的报告器: calculate_equity(reporter=...) 在每个批次完成后把 EquityResult 快照交给报告器，
+# 不传入报告器时不做任何进度相关的工作。报告器按 min_interval 秒限流，最后一个快照总会转发。
+# 图形界面的报告器(Qt 信号、Tk after)定义在各自的界面模块中
+
+
+class ProgressReporter:
+    def __init__(self, min_interval=0.1):
+        self.min_interval = min_interval
+        self._last_time = None
+
+    def report(self, snapshot):
+        finished = snapshot.samples >= snapshot.total
+        now = time.monotonic()
+        if not finished and self._last_time is not None and now - self._last_time < self.min_interval:
+            return
+        self._last_time = now
+        self.emit(snapshot)
+
+    def emit(self, snapshot):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CallbackReporter(ProgressReporter):
+    # 调用 callback(已完成样本数, 预计总样本数)，与原来的 progress_callback 兼容
+    def __init__(self, callback, min_interval=0.0):
+        super().__init__(min_interval)
+        self.callback = callback
+
+    def emit(self, snapshot):
+        self.callback(snapshot.samples, snapshot.total)
+
+
+class LoggingReporter(ProgressReporter):
+    def __init__(self, logger=None, level=logging.INFO, min_interval=1.0):
+        super().__init__(min_interval)
+        self.logger = logger or logging.getLogger('poker_calculator')
+        self.level = level
+
+    def emit(self, snapshot):
+        self.logger.log(self.level, "已完成 %d/%d 次模拟，当前胜率 %.2f%% ±%.2f%%", snapshot.samples,
+                        snapshot.total, snapshot.win_rate * 100, snapshot.ci_width * 50)
+
+
+class TqdmReporter(ProgressReporter):
+    # 命令行进度条；tqdm 只在真正显示进度条时才导入
+    def __init__(self, desc="Simulation Progress", min_interval=0.1):
+        super().__init__(min_interval)
+        self.desc = desc
+        self.progress_bar = None
+
+    def emit(self, snapshot):
+        if self.progress_bar is None:
+            # 直接由胜率表、缓存或胜率库得到结果时不显示进度条
+            if snapshot.samples >= snapshot.total:
+                return
+            from tqdm import tqdm
+            self.progress_bar = tqdm(total=snapshot.total, desc=self.desc, unit="sim", ncols=100)
+        self.progress_bar.update(snapshot.samples - self.progress_bar.n)
+        self.progress_bar.set_postfix_str(f"Win Rate: {snapshot.win_rate:.2%}", refresh=False)
+
+    def close(self):
+        if self.progress_bar is not None:
+            self.progress_bar.close()
+            self.progress_bar = None
@@ -1,26 +1,37 @@
 import sys
 import time
 import threading
+import multiprocessing
 import logging
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QComboBox, QLineEdit, QPushButton, QProgressBar, 
-                            QGroupBox, QMessageBox, QGridLayout, QFrame)
+                            QGroupBox, QMessageBox, QGridLayout, QFrame, QCheckBox)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(message)s')
-from poker_calculator import Card, Deck, HandEvaluator, PokerWinRateCalculator
+from poker_calculator import (Card, Deck, HandEvaluator, PokerWinRateCalculator, CalculationCancelled,
+                              CancellationToken)
+from poker_progress import ProgressReporter
 
 class ProgressUpdater(QThread):
-    progress_updated = pyqtSignal(int, int)
-
-    def __init__(self, callback):
-        super().__init__()
-        self.callback = callback
-
-    def update(self, current, total):
-        self.progress_updated.emit(current, total)
+    # 把计算线程中的 EquityResult 快照、最终结果和错误转发到主线程
+    progress_updated = pyqtSignal(object)
+    result_ready = pyqtSignal(object)
+    calculation_failed = pyqtSignal(object, str)
+
+class QtSignalReporter(ProgressReporter):
+    # 限流后通过 Qt 信号把 (cancel_token, 快照) 转发到主线程，避免大量信号堵塞事件循环；
+    # 主线程据 cancel_token 丢弃已被取代的计算的快照，计算被取消后也不再转发
+    def __init__(self, signal, cancel_token=None, min_interval=0.05):
+        super().__init__(min_interval)
+        self.signal = signal
+        self.cancel_token = cancel_token
+
+    def emit(self, snapshot):
+        if self.cancel_token is None or not self.cancel_token.cancelled:
+            self.signal.emit((self.cancel_token, snapshot))
 
 class PokerGUI(QMainWindow):
     def __init__(self):
@@ -41,7 +52,12 @@ class PokerGUI(QMainWindow):
         # 创建计算器实例
         self.calculator = None
         self.simulations = 10000
-        self.is_calculating = False
+        # 自适应模式下的95%置信区间宽度目标，None表示固定次数
+        self.target_ci_width = None
+        # 当前计算的取消令牌；新的计算请求会取消尚未完成的旧计算
+        self.cancel_token = None
+        # 当前请求是否由实时模式发起(实时模式下输入错误只显示在状态栏，不弹出对话框)
+        self.live_request = False
 
         # 创建中心部件
         central_widget = QWidget()
@@ -62,8 +78,23 @@ class PokerGUI(QMainWindow):
         self.create_progress_section()
 
         # 创建进度更新器
-        self.progress_updater = ProgressUpdater(self.update_progress)
+        self.progress_updater = ProgressUpdater()
         self.progress_updater.progress_updated.connect(self.on_progress_updated)
+        self.progress_updater.result_ready.connect(self.on_result_ready)
+        self.progress_updater.calculation_failed.connect(self.on_calculation_failed)
+
+        # 实时模式: 输入停止变化一段时间后自动重新计算
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(300)
+        self.live_timer.timeout.connect(lambda: self.calculate_win_rate(live=True))
+        for combo in (self.num_players_combo, self.stage_combo, self.hand1_suit_combo, self.hand1_rank_combo,
+                      self.hand2_suit_combo, self.hand2_rank_combo, self.flop1_suit_combo, self.flop1_rank_combo,
+                      self.flop2_suit_combo, self.flop2_rank_combo, self.flop3_suit_combo, self.flop3_rank_combo,
+                      self.turn_suit_combo, self.turn_rank_combo, self.river_suit_combo, self.river_rank_combo,
+                      self.precision_combo):
+            combo.currentIndexChanged.connect(self.on_input_changed)
+        self.custom_sim_entry.textChanged.connect(self.on_input_changed)
 
     def create_input_section(self):
         input_group = QGroupBox("输入参数")
@@ -178,7 +209,7 @@ class PokerGUI(QMainWindow):
         # 模拟精度
         input_layout.addWidget(QLabel("模拟精度:"), 5, 0, Qt.AlignLeft)
         self.precision_combo = QComboBox()
-        self.precision_combo.addItems(["快速模式 (1,000次)", "平衡模式 (10,000次)", "精确模式 (100,000次)", "自定义次数"])
+        self.precision_combo.addItems(["快速模式 (1,000次)", "平衡模式 (10,000次)", "精确模式 (100,000次)", "自适应模式 (±0.5%)", "自定义次数"])
         self.precision_combo.setCurrentText("平衡模式 (10,000次)")
         self.precision_combo.currentTextChanged.connect(self.on_precision_change)
         input_layout.addWidget(self.precision_combo, 5, 1, Qt.AlignLeft)
@@ -191,9 +222,14 @@ class PokerGUI(QMainWindow):
         # 按钮
         button_layout = QHBoxLayout()
         self.calculate_button = QPushButton("计算胜率")
-        self.calculate_button.clicked.connect(self.calculate_win_rate)
+        self.calculate_button.clicked.connect(lambda: self.calculate_win_rate())
         button_layout.addWidget(self.calculate_button)
 
+        self.live_checkbox = QCheckBox("实时计算")
+        self.live_checkbox.setToolTip("修改输入后自动计算：先快速估计，再逐步提高精度")
+        self.live_checkbox.toggled.connect(self.on_input_changed)
+        button_layout.addWidget(self.live_checkbox)
+
         self.reset_button = QPushButton("重置")
         self.reset_button.clicked.connect(self.reset_inputs)
         button_layout.addWidget(self.reset_button)
@@ -206,6 +242,18 @@ class PokerGUI(QMainWindow):
 
         self.main_layout.addWidget(input_group)
 
+    def on_input_changed(self, *args):
+        # 实时模式下输入变化时取消旧计算，并重新开始防抖计时
+        if self.live_checkbox.isChecked():
+            self.cancel_calculation()
+            self.live_timer.start()
+
+    def show_error(self, message):
+        if self.live_request:
+            self.status_label.setText(message)
+        else:
+            QMessageBox.critical(self, "错误", message)
+
     def on_precision_change(self, text):
         if text == "自定义次数":
             self.custom_sim_entry.show()
@@ -306,9 +354,10 @@ class PokerGUI(QMainWindow):
         self.progress_bar.setValue(0)
         self.progress_text_label.setText("就绪")
         self.calculator = None
-        self.is_calculating = False
+        self.cancel_calculation()
 
     def set_simulations(self):
+        self.target_ci_width = None
         precision = self.precision_combo.currentText()
         if precision == "快速模式 (1,000次)":
             self.simulations = 1000
@@ -316,16 +365,20 @@ class PokerGUI(QMainWindow):
             self.simulations = 10000
         elif precision == "精确模式 (100,000次)":
             self.simulations = 100000
+        elif precision == "自适应模式 (±0.5%)":
+            # 自适应模式下模拟次数只是上限，达到精度目标即停止
+            self.simulations = 1000000
+            self.target_ci_width = 0.01
         elif precision == "自定义次数":
             try:
                 custom = int(self.custom_sim_entry.text())
                 if 100 <= custom <= 1000000:
                     self.simulations = custom
                 else:
-                    QMessageBox.critical(self, "错误", "自定义次数必须在100到1,000,000之间")
+                    self.show_error("自定义次数必须在100到1,000,000之间")
                     return False
             except ValueError:
-                QMessageBox.critical(self, "错误", "请输入有效的数字")
+                self.show_error("请输入有效的数字")
                 return False
         return True
 
@@ -336,12 +389,18 @@ class PokerGUI(QMainWindow):
                 return key
         return 's'  # 默认返回黑桃
 
-    def calculate_win_rate(self):
+    def cancel_calculation(self):
+        if self.cancel_token is not None:
+            logging.info("取消尚未完成的计算")
+            self.cancel_token.cancel()
+            self.cancel_token = None
+
+    def calculate_win_rate(self, live=False):
         logging.info("开始计算胜率")
-        if self.is_calculating:
-            QMessageBox.information(self, "提示", "计算已在进行中，请等待完成")
-            logging.info("计算已在进行中，取消重复请求")
-            return
+        # 新的请求直接取代正在进行的旧计算
+        self.cancel_calculation()
+        self.live_timer.stop()
+        self.live_request = live
 
         # 设置模拟次数
         if not self.set_simulations():
@@ -351,10 +410,10 @@ class PokerGUI(QMainWindow):
         try:
             num_players = int(self.num_players_combo.currentText())
             if not 2 <= num_players <= 10:
-                QMessageBox.critical(self, "错误", "玩家数量必须在2到10之间")
+                self.show_error("玩家数量必须在2到10之间")
                 return
         except ValueError:
-            QMessageBox.critical(self, "错误", "请输入有效的玩家数量")
+            self.show_error("请输入有效的玩家数量")
             return
 
         # 构建手牌
@@ -369,14 +428,14 @@ class PokerGUI(QMainWindow):
 
             hand_input = [hand1, hand2]
         except Exception as e:
-            QMessageBox.critical(self, "错误", f"手牌构建错误: {str(e)}")
+            self.show_error(f"手牌构建错误: {str(e)}")
             return
 
         # 创建计算器实例
         try:
             self.calculator = PokerWinRateCalculator(num_players, hand_input)
         except ValueError as e:
-            QMessageBox.critical(self, "错误", f"手牌输入错误: {e}")
+            self.show_error(f"手牌输入错误: {e}")
             return
 
         # 添加公牌
@@ -418,12 +477,12 @@ class PokerGUI(QMainWindow):
                 self.calculator.add_community_cards(community_cards)
 
         except ValueError as e:
-            QMessageBox.critical(self, "错误", f"公牌输入错误: {e}")
+            self.show_error(f"公牌输入错误: {e}")
             return
 
         # 更新状态
         self.status_label.setText("计算中...")
-        self.is_calculating = True
+        self.cancel_token = CancellationToken()
         self.sim_count_label.setText(str(self.simulations))
 
         # 显示当前公牌和阶段
@@ -434,79 +493,94 @@ class PokerGUI(QMainWindow):
             self.community_cards_label.setText(f"{stage} - 无")
 
         # 在新线程中执行计算
-        threading.Thread(target=self.run_calculation).start()
-
-    def update_progress(self, current, total):
-        # 这个方法会在计算线程中被调用
-        self.progress_updater.update(current, total)
-
-    def on_progress_updated(self, current, total):
-        # 这个方法会在主线程中被调用
-        progress = (current / total) * 100
+        threading.Thread(target=self.run_calculation,
+                         args=(self.calculator, self.simulations, self.target_ci_width, self.cancel_token, live),
+                         daemon=True).start()
+
+    def on_progress_updated(self, payload):
+        # 这个方法会在主线程中被调用，显示逐步收敛的胜率估计；已被新请求取代的计算不再更新界面
+        cancel_token, snapshot = payload
+        if cancel_token is not self.cancel_token:
+            return
+        progress = (snapshot.samples / snapshot.total) * 100
         self.progress_bar.setValue(int(progress))
-        self.progress_text_label.setText(f"已完成 {current}/{total} 次模拟")
+        self.progress_text_label.setText(f"已完成 {snapshot.samples}/{snapshot.total} 次模拟")
+        self.win_rate_label.setText(f"{snapshot.win_rate:.2%} ±{snapshot.ci_width / 2:.2%}")
 
-    def run_calculation(self):
+    def run_calculation(self, calculator, simulations, target_ci_width, cancel_token, live=False):
+        # 参数在启动时固定，之后界面发起的新计算不会影响本次计算；结果通过信号交给主线程
         try:
             start_time = time.time()
-            win_rate = self.calculator.calculate_win_rate(self.simulations, self.update_progress)
-            elapsed_time = time.time() - start_time
-
-            # 计算优势倍数
-            avg_win_rate = 1 / self.calculator.num_players
-            win_advantage = win_rate / avg_win_rate if avg_win_rate > 0 else 0
-            logging.info(f"计算完成: 胜率={win_rate:.2%}, 优势倍数={win_advantage:.1f}x")
-
-            # 生成策略建议
-            if win_advantage >= 2.0:
-                strategy = "强烈建议加注"
-            elif win_advantage >= 1.5:
-                strategy = "建议跟注"
-            elif win_advantage >= 1.0:
-                strategy = "谨慎跟注"
+            reporter = QtSignalReporter(self.progress_updater.progress_updated, cancel_token)
+            if live:
+                # 实时模式: 先用少量样本快速估计，再在同一计算器上补足样本(已有样本会被复用)，
+                # 使用全部CPU核心的常驻进程池
+                stages = [(min(1000, simulations), None), (simulations, target_ci_width)]
+                workers = None
             else:
-                strategy = "建议弃牌"
-            logging.info(f"策略建议: {strategy}")
+                stages = [(simulations, target_ci_width)]
+                workers = PokerWinRateCalculator.suggest_workers(simulations)
+
+            for stage_simulations, stage_target in stages:
+                result = calculator.calculate_equity(stage_simulations, workers=workers, target_ci_width=stage_target,
+                                                     reporter=reporter, cancel_token=cancel_token, reuse_runouts=live)
+                win_rate = result.win_rate
+                elapsed_time = time.time() - start_time
+
+                # 计算优势倍数
+                avg_win_rate = 1 / calculator.num_players
+                win_advantage = win_rate / avg_win_rate if avg_win_rate > 0 else 0
+                logging.info(f"计算完成: 胜率={win_rate:.2%}, 优势倍数={win_advantage:.1f}x")
+
+                # 生成策略建议
+                if win_advantage >= 2.0:
+                    strategy = "强烈建议加注"
+                elif win_advantage >= 1.5:
+                    strategy = "建议跟注"
+                elif win_advantage >= 1.0:
+                    strategy = "谨慎跟注"
+                else:
+                    strategy = "建议弃牌"
+                logging.info(f"策略建议: {strategy}")
 
-            # 使用QTimer.singleShot确保在主线程中更新UI
-            logging.info("调度UI更新")
-            # 使用functools.partial避免lambda作用域问题
-            from functools import partial
-            update_func = partial(self.update_results, win_rate, win_advantage, strategy, elapsed_time)
-            QTimer.singleShot(0, update_func)
+                final = stage_simulations == simulations
+                self.progress_updater.result_ready.emit(
+                    (cancel_token, win_rate, win_advantage, strategy, elapsed_time, result.samples, final))
 
+        except CalculationCancelled:
+            logging.info("计算已取消")
         except Exception as e:
-            QTimer.singleShot(0, lambda: QMessageBox.critical(self, "计算错误", f"计算过程中出错: {str(e)}"))
-        finally:
-            self.is_calculating = False
-            QTimer.singleShot(0, lambda: self.status_label.setText("计算完成"))
+            self.progress_updater.calculation_failed.emit(cancel_token, f"计算过程中出错: {str(e)}")
 
-    def update_results(self, win_rate, win_advantage, strategy, elapsed_time):
-        logging.info(f"更新结果: 胜率={win_rate:.2%}, 优势倍数={win_advantage:.1f}x")
-        # 确保在主线程中更新UI
-        if QThread.currentThread() != QApplication.instance().thread():
-            logging.info("不在主线程中，切换到主线程更新UI")
-            QTimer.singleShot(0, lambda: self.update_results(win_rate, win_advantage, strategy, elapsed_time))
+    def on_result_ready(self, payload):
+        cancel_token, win_rate, win_advantage, strategy, elapsed_time, samples, final = payload
+        # 已被新请求取代的计算不再更新界面
+        if cancel_token is not self.cancel_token:
             return
+        self.update_results(win_rate, win_advantage, strategy, elapsed_time, samples)
+        self.status_label.setText("计算完成" if final else "正在提高精度...")
+
+    def on_calculation_failed(self, cancel_token, message):
+        if cancel_token is not self.cancel_token:
+            return
+        if self.live_request:
+            self.status_label.setText(message)
         else:
-            logging.info("在主线程中更新UI")
+            self.status_label.setText("计算出错")
+            QMessageBox.critical(self, "计算错误", message)
 
-        # 更新UI元素
+    def update_results(self, win_rate, win_advantage, strategy, elapsed_time, samples):
+        # 通过信号在主线程中调用
+        logging.info(f"更新结果: 胜率={win_rate:.2%}, 优势倍数={win_advantage:.1f}x")
         self.win_rate_label.setText(f"{win_rate:.2%}")
         self.advantage_label.setText(f"{win_advantage:.1f}x")
+        self.sim_count_label.setText(str(samples))
         #self.strategy_label.setText(f"{strategy} (基于{self.calculator.num_players}名玩家的竞争环境)")
         self.strategy_label.setText(f"{strategy}")
         self.progress_text_label.setText(f"计算完成 (耗时: {elapsed_time:.2f} 秒)")
 
-        # 强制更新UI
-        self.win_rate_label.repaint()
-        self.advantage_label.repaint()
-        self.strategy_label.repaint()
-        self.progress_text_label.repaint()
-        QApplication.instance().processEvents()
-        logging.info("UI更新完成")
-
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = PokerGUI()
     window.show()
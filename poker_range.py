@@ -0,0 +1,171 @@
+import random
+
+from poker_calculator import STARTING_HAND_RANKS, PokerWinRateCalculator, load_preflop_table
+
+# 对手手牌范围: 把 "QQ+, AKs, A5s-A2s, KQo:0.5, 20%" 这样的文本解析为带权重的具体组合，
+# 并用别名表(alias table)在 O(1) 时间内按权重抽取对手手牌
+#
+# 支持的写法(逗号分隔，可在末尾加 ":权重"):
+#   QQ / QQ+ / QQ-88     对子、该对子及以上、对子区间
+#   AKs / AKo / AK       同花、不同花、两者皆可
+#   A9s+ / K9o+          固定高张，踢脚从该点数升到比高张小一级
+#   AJs-A8s              固定高张的踢脚区间
+#   AsKs / Th9h          具体的一手牌
+#   20% / top 20%        按单挑胜率排序的前20%起手牌(需要翻牌前胜率表)
+
+
+def _rank_value(char):
+    index = STARTING_HAND_RANKS.find(char.upper())
+    if index < 0:
+        raise ValueError(f"无效的点数: {char}")
+    return index + 2
+
+
+def _label_combos(high, low, suited):
+    # high/low 为点数值；suited 为 True/False/None(None 表示同花和不同花都包含)
+    base_high = (high - 2) * 4
+    base_low = (low - 2) * 4
+    combos = []
+    if high == low:
+        for s1 in range(4):
+            for s2 in range(s1 + 1, 4):
+                combos.append((base_high + s2, base_high + s1))
+        return combos
+    for s1 in range(4):
+        for s2 in range(4):
+            if suited is None or suited == (s1 == s2):
+                combos.append((base_high + s1, base_low + s2))
+    return combos
+
+
+def _top_percent_labels(percent):
+    # 按单挑胜率从高到低累加起手牌，直到组合数达到总数(1326)的 percent%
+    table = load_preflop_table()
+    hands = table.get('hands')
+    if not hands:
+        raise ValueError("按百分比指定范围需要翻牌前胜率表 preflop_equity.json")
+    ranked = sorted(hands, key=lambda label: -(hands[label][0][0] + hands[label][0][1] / 2))
+    target = 1326 * percent / 100
+    labels = []
+    count = 0
+    for label in ranked:
+        if count >= target:
+            break
+        labels.append(label)
+        count += 6 if len(label) == 2 else (4 if label[2] == 's' else 12)
+    return labels
+
+
+def _parse_label(label):
+    # 'AKs' -> (14, 13, True)，'QQ' -> (12, 12, None)
+    high = _rank_value(label[0])
+    low = _rank_value(label[1])
+    if low > high:
+        high, low = low, high
+    suited = None
+    if len(label) == 3:
+        if label[2] not in 'so':
+            raise ValueError(f"无效的范围写法: {label}")
+        suited = label[2] == 's'
+    return high, low, suited
+
+
+def _parse_token(token):
+    # 返回该写法包含的具体组合列表
+    if token.lower().startswith('top'):
+        token = token[3:].strip()
+    if token.endswith('%'):
+        combos = []
+        for label in _top_percent_labels(float(token[:-1])):
+            combos.extend(_label_combos(*_parse_label(label)))
+        return combos
+
+    if token[:2] == '10' or (len(token) == 4 and token[1] in 'shdc♠♥♦♣'):
+        # 具体的一手牌，例如 AsKs、Th9h、10s9s
+        text = token.replace('T', '10').replace('t', '10')
+        split = 3 if text.startswith('10') else 2
+        cards = PokerWinRateCalculator.parse_cards([text[:split], text[split:]])
+        high, low = sorted((card.index for card in cards), reverse=True)
+        return [(high, low)]
+
+    if '-' in token:
+        start, end = (_parse_label(part.strip()) for part in token.split('-'))
+        if start[0] == start[1] and end[0] == end[1]:
+            low, high = sorted((start[0], end[0]))
+            return [combo for rank in range(low, high + 1) for combo in _label_combos(rank, rank, None)]
+        if start[0] != end[0] or start[2] != end[2]:
+            raise ValueError(f"无效的范围写法: {token}")
+        low, high = sorted((start[1], end[1]))
+        return [combo for kicker in range(low, high + 1) for combo in _label_combos(start[0], kicker, start[2])]
+
+    plus = token.endswith('+')
+    high, low, suited = _parse_label(token.rstrip('+'))
+    if not plus:
+        return _label_combos(high, low, suited)
+    if high == low:
+        return [combo for rank in range(high, 15) for combo in _label_combos(rank, rank, None)]
+    return [combo for kicker in range(low, high) for combo in _label_combos(high, kicker, suited)]
+
+
+class AliasTable:
+    # Vose 别名法: 构建 O(n)，每次按权重抽样 O(1)
+    def __init__(self, items, weights):
+        if not items:
+            raise ValueError("范围中没有可用的手牌组合")
+        count = len(items)
+        total = float(sum(weights))
+        scaled = [weight * count / total for weight in weights]
+        self.items = list(items)
+        self.prob = [1.0] * count
+        self.alias = list(range(count))
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    def sample(self, rng=random):
+        i = int(rng.random() * len(self.items))
+        return self.items[i] if rng.random() < self.prob[i] else self.items[self.alias[i]]
+
+
+class HandRange:
+    def __init__(self, text):
+        self.text = text
+        # (高位牌序号, 低位牌序号) -> 权重
+        self.weights = {}
+        for token in text.split(','):
+            token = token.strip()
+            if not token:
+                continue
+            weight = 1.0
+            if ':' in token:
+                token, weight_text = token.rsplit(':', 1)
+                weight = float(weight_text)
+                if not 0 <= weight <= 1:
+                    raise ValueError(f"权重必须在0到1之间: {weight_text}")
+                token = token.strip()
+            for combo in _parse_token(token):
+                self.weights[combo] = weight
+        if not self.weights:
+            raise ValueError(f"空的手牌范围: {text}")
+
+    def combos(self, dead_cards=()):
+        # 去除与已知牌冲突的组合(card removal)，返回 [((a, b), weight), ...]
+        dead = set(dead_cards)
+        return [(combo, weight) for combo, weight in self.weights.items()
+                if weight > 0 and combo[0] not in dead and combo[1] not in dead]
+
+    def sampler(self, dead_cards=()):
+        combos = self.combos(dead_cards)
+        return AliasTable([combo for combo, _ in combos], [weight for _, weight in combos])
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __repr__(self):
+        return f"HandRange({self.text!r}, combos={len(self)})"
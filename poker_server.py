@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from poker_calculator import EquityCache, PokerWinRateCalculator, _count_exact_deals, load_preflop_table
+
+# 本地胜率计算服务(HTTP/JSON)，只依赖标准库的 asyncio
+# 用法: python poker_server.py --port 8000 --workers 4
+#
+#   POST /equity   {"hand": "As Kd", "board": "Qh 7c 2d", "players": 3, "simulations": 10000,
+#                   "ranges": "QQ+, AKs", "engine": "auto", "seed": 1}   (board 之后的字段均可省略)
+#   GET  /metrics  请求数、合并数、拒绝数及最近请求的延迟分位数
+#   GET  /health
+#
+# 计算在预热过的进程池中进行；花色同构的并发请求合并为一次计算，
+# 等待中的计算数达到上限时返回 503，由客户端稍后重试
+
+MAX_SIMULATIONS = 1000000
+ENGINES = ('auto', 'exact', 'python', 'numpy')
+
+
+def _warm_worker():
+    # 工作进程启动时加载翻牌前胜率表和 NumPy 查找表(牌力查找表在导入时已经构建)
+    load_preflop_table()
+    try:
+        from poker_calculator import _get_numpy_tables
+        _get_numpy_tables()
+    except ImportError:
+        pass
+
+
+def _ping():
+    return os.getpid()
+
+
+def _calculate(calculator, simulations, engine, seed):
+    return calculator.calculate_equity(simulations, engine=engine, cache=None, seed=seed)
+
+
+def parse_request(body):
+    # 校验请求并返回 (计算器, 模拟次数, 引擎, 随机种子)，参数无效时抛出 ValueError
+    try:
+        spot = json.loads(body or b'{}')
+    except json.JSONDecodeError as e:
+        raise ValueError(f"无效的JSON: {e}")
+    if not isinstance(spot, dict):
+        raise ValueError("请求体必须是JSON对象")
+
+    def cards(value):
+        if not value:
+            return []
+        return value.replace(',', ' ').split() if isinstance(value, str) else list(value)
+
+    try:
+        players = int(spot.get('players', 2))
+        simulations = int(spot.get('simulations', 10000))
+        seed = None if spot.get('seed') is None else int(spot['seed'])
+    except (TypeError, ValueError):
+        raise ValueError("players、simulations 和 seed 必须是整数")
+    if not 2 <= players <= 10:
+        raise ValueError("玩家数量必须在2到10之间")
+    if not 1 <= simulations <= MAX_SIMULATIONS:
+        raise ValueError(f"模拟次数必须在1到{MAX_SIMULATIONS}之间")
+    engine = spot.get('engine', 'auto')
+    if engine not in ENGINES:
+        raise ValueError(f"未知的模拟引擎: {engine}。可选: {', '.join(ENGINES)}")
+
+    hand = cards(spot.get('hand'))
+    if len(hand) != 2:
+        raise ValueError("需要两张手牌，例如 \"As Kd\"")
+    calculator = PokerWinRateCalculator(players, hand)
+    board = cards(spot.get('board'))
+    if board:
+        calculator.add_community_cards(board)
+    if spot.get('ranges'):
+        calculator.set_opponent_ranges(spot['ranges'])
+    if engine == 'exact':
+        # 精确枚举的规模可能达到数十亿种，会长期占用工作进程；上限与 auto 在最大模拟次数下选择精确枚举的规模相同
+        known = len(calculator.my_cards) + len(calculator.community_cards)
+        deals = _count_exact_deals(52 - known, 5 - len(calculator.community_cards), players - 1)
+        if deals > MAX_SIMULATIONS * calculator.exact_cost_ratio:
+            raise ValueError(f"精确枚举的规模过大({deals}种)，请使用 auto 或模拟引擎")
+    return calculator, simulations, engine, seed
+
+
+class ServerMetrics:
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.computed = 0
+        self.coalesced = 0
+        self.cached = 0
+        self.rejected = 0
+        self.errors = 0
+        # 最近 window 个成功请求的延迟(毫秒)
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency_ms):
+        self.latencies.append(latency_ms)
+
+    def snapshot(self, pending):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 2)
+
+        return {
+            'requests': self.requests,
+            'computed': self.computed,
+            'coalesced': self.coalesced,
+            'cached': self.cached,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'pending': pending,
+            'latency_ms': {'p50': percentile(0.5), 'p90': percentile(0.9), 'p99': percentile(0.99),
+                           'max': percentile(1.0), 'window': len(latencies)},
+        }
+
+
+class EquityServer:
+    def __init__(self, workers=None, max_pending=64, cache_size=4096):
+        self.workers = workers or os.cpu_count() or 1
+        # 同时等待计算的不同牌局数上限，超过时返回 503
+        self.max_pending = max_pending
+        self.pool = None
+        self.cache = EquityCache(maxsize=cache_size)
+        # 规范化的牌局键 -> 正在进行的计算(asyncio.Future)，相同的并发请求共享同一个计算
+        self.pending = {}
+        self.metrics = ServerMetrics()
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+        loop = asyncio.get_running_loop()
+        # 预先启动全部工作进程，第一个请求不必承担进程启动和建表的开销
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _ping) for _ in range(self.workers)))
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    async def equity(self, calculator, simulations, engine, seed=None):
+        # 返回 (EquityResult, 来源)，来源为 computed、coalesced 或 cached
+        # 指定种子时结果与具体花色有关，只合并完全相同的牌局
+        key = calculator.canonical_key(simulations, engine)
+        if seed is not None:
+            key += (seed, calculator.runout_state())
+        result = self.cache.get(key)
+        if result is not None:
+            return result, 'cached'
+        future = self.pending.get(key)
+        if future is not None:
+            return await asyncio.shield(future), 'coalesced'
+        if len(self.pending) >= self.max_pending:
+            return None, 'rejected'
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, _calculate, calculator, simulations, engine, seed)
+        self.pending[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            del self.pending[key]
+        self.cache.put(key, result)
+        return result, 'computed'
+
+    async def handle_request(self, method, path, body):
+        # 返回 (状态码, JSON对象)
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'workers': self.workers}
+        if method == 'GET' and path == '/metrics':
+            return 200, self.metrics.snapshot(len(self.pending))
+        if path != '/equity':
+            return 404, {'error': f"未知的路径: {path}"}
+        if method != 'POST':
+            return 405, {'error': "请使用 POST"}
+
+        start = time.perf_counter()
+        self.metrics.requests += 1
+        try:
+            calculator, simulations, engine, seed = parse_request(body)
+            result, source = await self.equity(calculator, simulations, engine, seed)
+        except ValueError as e:
+            self.metrics.errors += 1
+            return 400, {'error': str(e)}
+        if result is None:
+            self.metrics.rejected += 1
+            return 503, {'error': "服务繁忙，请稍后重试"}
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        setattr(self.metrics, source, getattr(self.metrics, source) + 1)
+        self.metrics.record(latency_ms)
+        return 200, {
+            'win_rate': result.win_rate,
+            'tie_rate': result.tie_rate,
+            'ci_low': result.ci_low,
+            'ci_high': result.ci_high,
+            'samples': result.samples,
+            'engine': result.engine,
+            'source': source,
+            'latency_ms': round(latency_ms, 2),
+        }
+
+    async def handle_connection(self, reader, writer):
+        # 极简的 HTTP/1.1 实现: 每个连接处理一个请求后关闭
+        try:
+            header = await reader.readuntil(b'\r\n\r\n')
+            lines = header.decode('latin-1').split('\r\n')
+            method, path = lines[0].split(' ')[:2]
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            body = await reader.readexactly(length) if length else b''
+            status, payload = await self.handle_request(method, path.split('?')[0], body)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status, payload = 400, {'error': "无效的HTTP请求"}
+        except Exception as e:
+            self.metrics.errors += 1
+            status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                  500: 'Internal Server Error', 503: 'Service Unavailable'}[status]
+        extra = 'Retry-After: 1\r\n' if status == 503 else ''
+        writer.write((f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                      f"Content-Length: {len(data)}\r\n{extra}Connection: close\r\n\r\n").encode('latin-1') + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+async def serve(host, port, workers, max_pending):
+    server = EquityServer(workers, max_pending)
+    try:
+        tcp_server = await server.start(host, port)
+        print(f"胜率服务已启动: http://{host}:{port}/equity ({server.workers} 个工作进程)")
+        async with tcp_server:
+            await tcp_server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="本地胜率计算HTTP服务")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=8000, help="监听端口")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="计算进程数")
+    parser.add_argument('--max-pending', type=int, default=64, help="同时等待计算的牌局数上限，超过时返回503")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,26 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import time
-from poker_calculator import Card, Deck, HandEvaluator, PokerWinRateCalculator
+from poker_calculator import (Card, Deck, HandEvaluator, PokerWinRateCalculator, CalculationCancelled,
+                              CancellationToken)
+from poker_progress import ProgressReporter
 import threading
+import multiprocessing
 import random
 
+class TkAfterReporter(ProgressReporter):
+    # Tk 控件只能在主线程中更新: 限流后通过 root.after 把快照和所属计算的 cancel_token 交给主线程，
+    # 由主线程判断是否仍是当前的计算；计算被取消后不再转发
+    def __init__(self, root, callback, cancel_token=None, min_interval=0.05):
+        super().__init__(min_interval)
+        self.root = root
+        self.callback = callback
+        self.cancel_token = cancel_token
+
+    def emit(self, snapshot):
+        if self.cancel_token is None or not self.cancel_token.cancelled:
+            self.root.after(0, self.callback, snapshot, self.cancel_token)
+
 class PokerGUI:
     def __init__(self, root):
         self.root = root
@@ -26,7 +42,10 @@ class PokerGUI:
         # 创建计算器实例
         self.calculator = None
         self.simulations = 10000
-        self.is_calculating = False
+        # 自适应模式下的95%置信区间宽度目标，None表示固定次数
+        self.target_ci_width = None
+        # 当前计算的取消令牌；新的计算请求会取消尚未完成的旧计算
+        self.cancel_token = None
 
         # 创建主框架
         self.main_frame = ttk.Frame(root, padding="20")
@@ -156,7 +175,7 @@ class PokerGUI:
         ttk.Label(input_frame, text="模拟精度:").grid(row=5, column=0, sticky=tk.W, pady=5)
         self.precision_var = tk.StringVar(value="平衡模式 (10,000次)")
         precision_combo = ttk.Combobox(input_frame, textvariable=self.precision_var, 
-                                       values=["快速模式 (1,000次)", "平衡模式 (10,000次)", "精确模式 (100,000次)", "自定义次数"], width=20)
+                                       values=["快速模式 (1,000次)", "平衡模式 (10,000次)", "精确模式 (100,000次)", "自适应模式 (±0.5%)", "自定义次数"], width=20)
         precision_combo.grid(row=5, column=1, sticky=tk.W, pady=5)
 
         # 自定义次数输入框 (默认隐藏)
@@ -261,9 +280,10 @@ class PokerGUI:
         self.progress_var.set(0)
         self.progress_text_var.set("就绪")
         self.calculator = None
-        self.is_calculating = False
+        self.cancel_calculation()
 
     def set_simulations(self):
+        self.target_ci_width = None
         precision = self.precision_var.get()
         if precision == "快速模式 (1,000次)":
             self.simulations = 1000
@@ -271,6 +291,10 @@ class PokerGUI:
             self.simulations = 10000
         elif precision == "精确模式 (100,000次)":
             self.simulations = 100000
+        elif precision == "自适应模式 (±0.5%)":
+            # 自适应模式下模拟次数只是上限，达到精度目标即停止
+            self.simulations = 1000000
+            self.target_ci_width = 0.01
         elif precision == "自定义次数":
             try:
                 custom = int(self.custom_sim_var.get())
@@ -291,10 +315,14 @@ class PokerGUI:
                 return key
         return 's'  # 默认返回黑桃
 
+    def cancel_calculation(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.cancel_token = None
+
     def calculate_win_rate(self):
-        if self.is_calculating:
-            messagebox.showinfo("提示", "计算已在进行中，请等待完成")
-            return
+        # 新的请求直接取代正在进行的旧计算
+        self.cancel_calculation()
 
         # 设置模拟次数
         if not self.set_simulations():
@@ -376,7 +404,7 @@ class PokerGUI:
 
         # 更新状态
         self.status_var.set("计算中...")
-        self.is_calculating = True
+        self.cancel_token = CancellationToken()
         self.sim_count_var.set(str(self.simulations))
 
         # 显示当前公牌和阶段
@@ -387,23 +415,38 @@ class PokerGUI:
             self.community_cards_var.set(f"{stage} - 无")
 
         # 在新线程中执行计算
-        threading.Thread(target=self.run_calculation).start()
+        threading.Thread(target=self.run_calculation,
+                         args=(self.calculator, self.simulations, self.target_ci_width, self.cancel_token),
+                         daemon=True).start()
+
+    def is_current(self, cancel_token):
+        # 在主线程中判断结果是否属于当前的计算；取消或被新的计算替换后的结果一律丢弃
+        return cancel_token is not None and cancel_token is self.cancel_token
 
-    def progress_callback(self, current, total):
-        # 更新进度条
-        progress = (current / total) * 100
+    def progress_callback(self, snapshot, cancel_token=None):
+        # 更新进度条，并显示逐步收敛的胜率估计
+        if not self.is_current(cancel_token):
+            return
+        progress = (snapshot.samples / snapshot.total) * 100
         self.progress_var.set(progress)
-        self.progress_text_var.set(f"已完成 {current}/{total} 次模拟")
-        self.root.update_idletasks()
+        self.progress_text_var.set(f"已完成 {snapshot.samples}/{snapshot.total} 次模拟")
+        self.win_rate_var.set(f"{snapshot.win_rate:.2%} ±{snapshot.ci_width / 2:.2%}")
 
-    def run_calculation(self):
+    def run_calculation(self, calculator, simulations, target_ci_width, cancel_token):
+        # 参数在启动时固定，之后界面发起的新计算不会影响本次计算
         try:
             start_time = time.time()
-            win_rate = self.calculator.calculate_win_rate(self.simulations, self.progress_callback)
+            workers = PokerWinRateCalculator.suggest_workers(simulations)
+            reporter = TkAfterReporter(self.root, self.progress_callback, cancel_token)
+            result = calculator.calculate_equity(simulations, workers=workers, target_ci_width=target_ci_width,
+                                                 reporter=reporter, cancel_token=cancel_token)
+            if cancel_token.cancelled:
+                return
+            win_rate = result.win_rate
             elapsed_time = time.time() - start_time
 
             # 计算优势倍数
-            avg_win_rate = 1 / self.calculator.num_players
+            avg_win_rate = 1 / calculator.num_players
             win_advantage = win_rate / avg_win_rate if avg_win_rate > 0 else 0
 
             # 生成策略建议
@@ -416,22 +459,36 @@ class PokerGUI:
             else:
                 strategy = "建议弃牌"
 
-            # 更新UI
-            self.root.after(0, lambda: self.update_results(win_rate, win_advantage, strategy, elapsed_time))
+            # 更新UI: 是否仍是当前的计算由主线程在执行时判断
+            self.root.after(0, self.update_results, cancel_token, calculator.num_players, win_rate, win_advantage,
+                            strategy, elapsed_time, result.samples)
 
+        except CalculationCancelled:
+            pass
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("计算错误", f"计算过程中出错: {str(e)}"))
+            self.root.after(0, self.show_error, cancel_token, str(e))
         finally:
-            self.is_calculating = False
-            self.root.after(0, lambda: self.status_var.set("计算完成"))
+            self.root.after(0, self.finish_calculation, cancel_token)
 
-    def update_results(self, win_rate, win_advantage, strategy, elapsed_time):
+    def update_results(self, cancel_token, num_players, win_rate, win_advantage, strategy, elapsed_time, samples):
+        if not self.is_current(cancel_token):
+            return
         self.win_rate_var.set(f"{win_rate:.2%}")
         self.advantage_var.set(f"{win_advantage:.1f}x")
-        self.strategy_var.set(f"{strategy} (基于{self.calculator.num_players}名玩家的竞争环境)")
+        self.sim_count_var.set(str(samples))
+        self.strategy_var.set(f"{strategy} (基于{num_players}名玩家的竞争环境)")
         self.progress_text_var.set(f"计算完成 (耗时: {elapsed_time:.2f} 秒)")
 
+    def show_error(self, cancel_token, message):
+        if self.is_current(cancel_token):
+            messagebox.showerror("计算错误", f"计算过程中出错: {message}")
+
+    def finish_calculation(self, cancel_token):
+        if self.is_current(cancel_token):
+            self.status_var.set("计算完成")
+
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = PokerGUI(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,37 @@
+import unittest
+
+from poker_batch import compute_spot
+
+# 运行: python -m unittest -v  或  python -m pytest -q
+
+
+class ComputeSpotTest(unittest.TestCase):
+    def test_invalid_spots_become_error_rows(self):
+        lines = [
+            'not json',
+            '[1, 2]',
+            '{"hand": "As", "players": 2}',
+            '{"hand": "As Kd", "players": 11}',
+            '{"hand": "As Kd", "players": 2, "simulations": -5}',
+            '{"hand": "As Kd", "players": 2, "simulations": 0}',
+            '{"hand": "As Kd", "players": 2, "simulations": 5000000}',
+        ]
+        for line, text in enumerate(lines, start=1):
+            row = compute_spot(line, text, 1000, 'python')
+            self.assertIn('error', row, text)
+            self.assertNotIn('win_rate', row, text)
+
+    def test_oversized_exact_enumeration_is_rejected(self):
+        row = compute_spot(1, '{"hand": "As Kd", "players": 6}', 1000, 'exact')
+        self.assertIn('精确枚举的规模过大', row['error'])
+        row = compute_spot(2, '{"hand": "As Kd", "board": "Qh 7c 2d 9s 3h", "players": 2}', 1000, 'exact')
+        self.assertEqual(row['engine'], 'exact')
+
+    def test_csv_empty_simulations_use_default(self):
+        spot = {'hand': 'As Kd', 'board': '', 'players': '2', 'simulations': '', 'ranges': '', 'seed': ''}
+        row = compute_spot(1, spot, 1234, 'python')
+        self.assertEqual(row['samples'], 1234)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import random
+import unittest
+from itertools import combinations
+
+from poker_calculator import CARDS, HandEvaluator, PokerWinRateCalculator
+
+# 运行: python -m unittest -v  或  python -m pytest -q
+
+
+class HandEvaluatorTest(unittest.TestCase):
+    def test_lookup_scores_order_like_reference_tuples(self):
+        # 查表得到的整数牌力与 evaluate_5_card_hand 在21种组合中取最大的元组保持完全相同的大小顺序
+        rng = random.Random(20240501)
+        hands = []
+        for _ in range(20000):
+            indices = rng.sample(range(52), 7)
+            cards = [CARDS[i] for i in indices]
+            reference = max(HandEvaluator.evaluate_5_card_hand(combo) for combo in combinations(cards, 5))
+            score = HandEvaluator.evaluate_indices(indices)
+            self.assertEqual(score, HandEvaluator.evaluate_hand(cards))
+            hands.append((reference, score))
+
+        hands.sort()
+        for (reference_a, score_a), (reference_b, score_b) in zip(hands, hands[1:]):
+            if reference_a == reference_b:
+                self.assertEqual(score_a, score_b)
+            else:
+                self.assertLess(score_a, score_b)
+
+
+class SeededEquityTest(unittest.TestCase):
+    def calculate(self, engine, workers):
+        calculator = PokerWinRateCalculator(3, ['As', 'Kd'])
+        calculator.add_community_cards(['Qh', '7c', '2d'])
+        result = calculator.calculate_equity(5000, workers=workers, engine=engine, cache=None, seed=7)
+        return result.wins, result.ties, result.samples
+
+    def test_seeded_counts_do_not_depend_on_workers(self):
+        # 指定种子时每1000个样本一个子种子，结果与进程数无关，NumPy 引擎与 python 引擎逐样本一致
+        expected = self.calculate('python', 1)
+        self.assertEqual(self.calculate('python', 4), expected)
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            self.skipTest("未安装 NumPy")
+        self.assertEqual(self.calculate('numpy', 1), expected)
+        self.assertEqual(self.calculate('numpy', 4), expected)
+
+
+class RunoutReuseTest(unittest.TestCase):
+    def test_runouts_recorded_only_on_request(self):
+        calculator = PokerWinRateCalculator(2, ['As', 'Kd'])
+        calculator.add_community_cards(['Qh', '7c', '2d'])
+        calculator.calculate_equity(2000, engine='python', cache=None)
+        self.assertEqual(len(calculator.consistent_runouts()), 0)
+
+        first = calculator.calculate_equity(2000, engine='python', cache=None, reuse_runouts=True)
+        # 同一街再次计算时全部复用，不再模拟
+        again = calculator.calculate_equity(2000, engine='python', cache=None, reuse_runouts=True)
+        self.assertEqual((again.wins, again.ties, again.samples), (first.wins, first.ties, first.samples))
+
+        # 转牌后只有恰好发出该转牌的样本仍然有效
+        calculator.add_community_cards(['9s'])
+        reused = calculator.consistent_runouts()
+        self.assertLess(len(reused), first.samples // 5)
+        self.assertTrue(all(runout & (1 << calculator.community_cards[-1].index) for runout in reused))
+
+
+if __name__ == "__main__":
+    unittest.main()
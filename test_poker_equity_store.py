@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+
+from poker_calculator import PokerWinRateCalculator
+from poker_equity_store import EquityStore
+
+# 运行: python -m unittest -v  或  python -m pytest -q
+
+
+class EquityStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = EquityStore(os.path.join(directory.name, 'equity.sqlite3'))
+        self.addCleanup(self.store.close)
+
+    def calculator(self):
+        calculator = PokerWinRateCalculator(2, ['As', 'Kd'])
+        calculator.add_community_cards(['Qh', '7c', '2d'])
+        return calculator
+
+    def test_partial_exact_enumeration_is_not_stored(self):
+        # 只取第一个快照就关闭生成器，部分枚举结果不能以精确结果的身份写入库中
+        snapshots = self.calculator().iter_equity(engine='exact', cache=None, store=self.store, interval=0)
+        partial = next(snapshots)
+        snapshots.close()
+        self.assertLess(partial.samples, partial.total)
+        self.assertIsNone(self.store.get(self.calculator().canonical_state()))
+
+        result = self.calculator().calculate_equity(engine='exact', cache=None, store=self.store)
+        wins, ties, samples, exact = self.store.get(self.calculator().canonical_state())
+        self.assertTrue(exact)
+        self.assertEqual((wins, ties, samples), (result.wins, result.ties, result.samples))
+        self.assertEqual(self.calculator().calculate_equity(cache=None, store=self.store).win_rate,
+                         result.win_rate)
+
+    def test_simulation_samples_accumulate(self):
+        first = self.calculator().calculate_equity(2000, engine='python', cache=None, store=self.store)
+        self.calculator().calculate_equity(5000, engine='python', cache=None, store=self.store)
+        wins, ties, samples, exact = self.store.get(self.calculator().canonical_state())
+        self.assertFalse(exact)
+        self.assertEqual(samples, 5000)
+        self.assertGreaterEqual(wins, first.wins)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from itertools import product
+
+from poker_calculator import HandEvaluator, PokerWinRateCalculator
+from poker_range import HandRange
+
+# 运行: python -m unittest -v  或  python -m pytest -q
+
+
+def _indices(text):
+    return [card.index for card in PokerWinRateCalculator.parse_cards(text.split())]
+
+
+class HandRangeTest(unittest.TestCase):
+    def test_combo_counts(self):
+        cases = {
+            'QQ': 6, 'QQ+': 18, 'QQ-88': 30, 'AKs': 4, 'AKo': 12, 'AK': 16, 'A9s+': 20, 'K9o+': 48,
+            'AJs-A8s': 16, 'AsKs': 1, 'Th9h': 1, '10s9s': 1, 'QQ+, AKs': 22,
+        }
+        for text, count in cases.items():
+            self.assertEqual(len(HandRange(text)), count, text)
+
+    def test_weights_and_card_removal(self):
+        hand_range = HandRange("KK, KQo:0.5")
+        self.assertEqual(sorted(set(hand_range.weights.values())), [0.5, 1.0])
+        # 已知 Ks 后剩下 3 个 KK 和 9 个 KQo
+        combos = hand_range.combos(_indices("Ks"))
+        self.assertEqual(len(combos), 12)
+        self.assertEqual(sum(weight for _, weight in combos), 3 + 9 * 0.5)
+
+    def test_invalid_ranges(self):
+        for text in ('AKx', 'AK:2', 'AKs-QJs', 'ZZ', ' , '):
+            with self.assertRaises(ValueError, msg=text):
+                HandRange(text)
+
+
+class RangeSimulationTest(unittest.TestCase):
+    def joint_reference(self, my_cards, board, ranges):
+        # 按权重之积枚举互不冲突的对手手牌组合(整组拒绝抽样的极限)，公牌已发完时胜率可精确计算
+        dead = my_cards + board
+        my_score = HandEvaluator.evaluate_indices(my_cards + board)
+        total = 0.0
+        share = 0.0
+        for holes in product(*(HandRange(r).combos(dead) for r in ranges)):
+            cards = [card for combo, _ in holes for card in combo]
+            if len(set(cards)) < len(cards):
+                continue
+            weight = 1.0
+            for _, w in holes:
+                weight *= w
+            best = max(HandEvaluator.evaluate_indices(list(combo) + board) for combo, _ in holes)
+            total += weight
+            if my_score > best:
+                share += weight
+            elif my_score == best:
+                share += weight / 2
+        return share / total
+
+    def test_conflicting_ranges_follow_joint_distribution(self):
+        # AA 会挡住一半的 AK，正确的联合分布中对手1持有 72o 的概率为 0.75，而不是按自身组合数的 0.6
+        my_cards, board = ['Qs', 'Qd'], ['9c', '8d', '5h', '3s', '2c']
+        ranges = ['AA, 72o', 'AK']
+        expected = self.joint_reference(_indices(' '.join(my_cards)), _indices(' '.join(board)), ranges)
+        calculator = PokerWinRateCalculator(3, my_cards)
+        calculator.add_community_cards(board)
+        calculator.set_opponent_ranges(ranges)
+        result = calculator.calculate_equity(20000, engine='python', cache=None, seed=3)
+        self.assertAlmostEqual(expected, 0.75)
+        self.assertLess(abs(result.win_rate - expected), 0.02)
+
+    def test_range_order_does_not_matter(self):
+        # 对手1抽到 KhKc 时剩下的 AKs(AhKh、AcKc)全部被挡住，应整组重抽而不是报错；两种顺序的结果一致
+        rates = []
+        for ranges in (['QQ+', 'AKs'], ['AKs', 'QQ+']):
+            calculator = PokerWinRateCalculator(3, ['Ks', 'Kd'])
+            calculator.set_opponent_ranges(ranges)
+            rates.append(calculator.calculate_equity(20000, engine='python', cache=None, seed=5).win_rate)
+        self.assertLess(abs(rates[0] - rates[1]), 0.03)
+
+
+if __name__ == "__main__":
+    unittest.main()